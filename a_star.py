@@ -1,95 +1,103 @@
-import heapq
-from itertools import product
+import search
+from agent_core import GridAgent
 
+# extra cost of a cell that is always dangerous, in moves
+PRIOR_WEIGHT = 0.5
 
-class AStarAgent:
-    def __init__(self):
-        self.keymaker_position = None
-        self.key_position = None
-        self.danger_zones = set()
-        self.current_position = (0, 0)
-        self.n_moves = 0
 
-    def initialize(self, env):
-        self.keymaker_position = env.keymaker_position
-        self.key_position = None
-        self.danger_zones = set()
-        self.current_position = (0, 0)
-        self.n_moves = 0
-
-    def read_obs(self, obs):
-        for i in range(len(obs)):
-            line = obs[i]
-            if len(line) >= 3:
-                x = int(line[0])
-                y = int(line[1])
-                obj = line[2]
-                if obj in ["P", "A", "S"]:
-                    self.danger_zones.add((x, y))
-                if obj == "B":
-                    self.key_position = (x, y)
+class AStarAgent(GridAgent):
+    """Agent that follows an A* path and searches again only when needed.
 
-    def get_distance(self, start, target):
-        return abs(start[0] - target[0]) + abs(start[1] - target[1])
+    Seeing more dangers can not make the rest of a shortest path longer, so
+    the path is kept until a newly observed danger lies on it. A wider
+    perception range shows such dangers earlier, from farther away.
+    """
 
-    def get_legal_moves(self, position, visited):
-        moves = []
-        for i, j in product([-1, 0, 1], repeat=2):
-            if abs(i) + abs(j) > 1:
-                continue
-            new_position = (position[0] + i, position[1] + j)
-            if new_position in self.danger_zones:
-                continue
-            if new_position[0] < 0 or new_position[1] < 0:
-                continue
-            if new_position[0] > 8 or new_position[1] > 8:
-                continue
-            if new_position in visited:
-                continue
-            moves.append(new_position)
-        return moves
+    def __init__(self, prior=None, prior_weight=PRIOR_WEIGHT):
+        super().__init__()
+        # with a danger_prior.DangerPrior, cells not seen yet cost extra in
+        # proportion to how often they are dangerous on generated maps
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self.penalty = None
+        self.agent_perception_range = None
+        self.path = None
+        self.path_ptr = 0
+        # the path was cut by the deadline and ends before the keymaker
+        self.partial = False
 
-    def a_star(self, target):
-        visited = set()
-        if self.current_position == target:
-            return None
-        queue = [
-            (
-                self.get_distance(self.current_position, target),
-                0,
-                self.get_distance(self.current_position, target),
-                self.current_position,
-                [],
-            )
-        ]
+    def initialize(self, env):
+        super().initialize(env)
+        self.agent_perception_range = env.agent_perception_range
+        self.path = None
+        self.path_ptr = 0
+        self.partial = False
+        self.penalty = None
+        if self.prior is not None:
+            if self.prior.grid_size != self.grid_size:
+                raise ValueError(
+                    f"danger prior is for a {self.prior.grid_size}x"
+                    f"{self.prior.grid_size} grid, the map is "
+                    f"{self.grid_size}x{self.grid_size}"
+                )
+            self.penalty = [
+                self.prior_weight * p
+                for p in self.prior.probabilities(self.keymaker_position)
+            ]
 
-        while queue:
-            _, cur_len, _, pos, path = heapq.heappop(queue)
-            visited.add(pos)
-            if pos == target:
-                return path[0]
+    def clear_penalty(self):
+        # the cells in view are known now, dangers among them are blocked
+        x, y = self.current_position
+        r = self.agent_perception_range
+        n = self.grid_size
+        for seen_x in range(max(x - r, 0), min(x + r + 1, n)):
+            row = seen_x * n
+            for seen_y in range(max(y - r, 0), min(y + r + 1, n)):
+                self.penalty[row + seen_y] = 0
 
-            for move in self.get_legal_moves(pos, visited):
-                heapq.heappush(
-                    queue,
-                    (
-                        cur_len + 1 + self.get_distance(move, target),
-                        cur_len + 1,
-                        self.get_distance(move, target),
-                        move,
-                        path + [move],
-                    ),
-                )
+    def a_star(self, target):
+        if self.stats is not None:
+            self.stats.replans += 1
+        self.path = search.a_star(
+            search.to_cell(self.current_position, self.grid_size),
+            search.to_cell(target, self.grid_size),
+            self.grid_size,
+            self.blocked,
+            self.stats,
+            self.deadline,
+            self.penalty,
+            # learned by the moves of earlier cut searches
+            self.learned if self.deadline is not None else None,
+        )
+        self.path_ptr = 0
+        self.partial = self.deadline_hit()
 
-        return None
+    def path_blocked(self, new_dangers):
+        if not new_dangers:
+            return False
+        blocked = self.blocked
+        return any(blocked[cell] for cell in self.path[self.path_ptr :])
 
     def step(self, obs):
-        self.read_obs(obs)
-        next_move = self.a_star(self.keymaker_position)
+        new_dangers = self.read_obs(obs)
         if self.current_position == self.keymaker_position:
             return f"e {self.n_moves}"
+        if self.penalty is not None:
+            self.clear_penalty()
+
+        if self.path is None or self.path_blocked(new_dangers):
+            self.a_star(self.keymaker_position)
+        if self.partial:
+            next_move = self.cut_move(self.path[0] if self.path else None)
+            self.path = None
+        elif self.path and self.path_ptr < len(self.path):
+            next_move = search.to_position(self.path[self.path_ptr], self.grid_size)
+            self.path_ptr += 1
+        else:
+            next_move = None
         if next_move is None:
             return "e -1"
+
         self.current_position = next_move
         self.n_moves += 1
         return next_move
@@ -0,0 +1,154 @@
+from functools import lru_cache
+from time import perf_counter_ns
+
+import bitboard
+import search
+
+SHORTEST_DISTANCE_CACHE_SIZE = 4096
+
+
+# games often end with the same keymaker and known dangers, the bytes of
+# the danger cells are the fingerprint; hits and misses are in cache_info()
+@lru_cache(maxsize=SHORTEST_DISTANCE_CACHE_SIZE)
+def shortest_distance(keymaker_position, blocked, grid_size):
+    return bitboard.bfs_distance(
+        (0, 0), keymaker_position, grid_size, bitboard.from_cells(blocked)
+    )
+
+
+class GridAgent:
+    """State and observation handling shared by all agents.
+
+    Agents work in Environment coordinates and are driven through
+    ``initialize(env)`` and ``step(obs)``, either by the in-process harness
+    or by the judge adapter in protocol.py. ``initialize`` only needs
+    ``keymaker_position`` and ``grid_size`` from its argument.
+    """
+
+    def __init__(self):
+        self.keymaker_position = None
+        self.key_position = None
+        self.danger_zones = set()
+        self.grid_size = 9
+        # one byte per flat cell, 1 for the known dangers
+        self.blocked = bytearray(self.grid_size * self.grid_size)
+        self.current_position = (0, 0)
+        self.n_moves = 0
+        # distance estimates raised by cut searches and fallback_move
+        self.learned = {}
+        # search counters, None unless enable_stats() was called
+        self.stats = None
+        # per move search budget, None unless set_deadline() was called
+        self.deadline = None
+
+    def initialize(self, env):
+        self.keymaker_position = env.keymaker_position
+        self.grid_size = env.grid_size
+        self.key_position = None
+        self.danger_zones = set()
+        self.blocked = bytearray(self.grid_size * self.grid_size)
+        self.current_position = (0, 0)
+        self.n_moves = 0
+        self.learned = {}
+        # the per-size search tables are built here, not in the first step
+        search.get_neighbors(self.grid_size)
+        search.get_buffers(self.grid_size * self.grid_size)
+
+    def enable_stats(self):
+        # wraps step on this instance only, agents without instrumentation
+        # pay nothing but the `stats is not None` checks in the searches;
+        # step is wrapped once, later calls only reset the counters
+        if self.stats is not None:
+            self.stats.reset()
+            return self.stats
+        self.stats = search.SearchStats()
+        step = self.step
+
+        def timed_step(obs):
+            start_t = perf_counter_ns()
+            move = step(obs)
+            self.stats.step_time += perf_counter_ns() - start_t
+            self.stats.steps += 1
+            return move
+
+        self.step = timed_step
+        return self.stats
+
+    def set_deadline(self, deadline):
+        self.deadline = deadline
+
+    # returns flat indices of the danger cells seen for the first time,
+    # every step starts with it, so the move budget is restarted here
+    def read_obs(self, obs):
+        if self.deadline is not None:
+            self.deadline.start()
+        new_dangers = []
+        for i in range(len(obs)):
+            line = obs[i]
+            if len(line) >= 3:
+                x = int(line[0])
+                y = int(line[1])
+                obj = line[2]
+                if obj in ["P", "A", "S"] and (x, y) not in self.danger_zones:
+                    self.danger_zones.add((x, y))
+                    self.blocked[x * self.grid_size + y] = 1
+                    new_dangers.append(x * self.grid_size + y)
+                if obj == "B":
+                    self.key_position = (x, y)
+        return new_dangers
+
+    def get_distance(self, start, target):
+        return abs(start[0] - target[0]) + abs(start[1] - target[1])
+
+    def deadline_hit(self):
+        return self.deadline is not None and self.deadline.hit
+
+    # moves of the longest route to the keymaker the known map can have
+    def longest_route(self):
+        return self.grid_size * self.grid_size - len(self.danger_zones)
+
+    # distance to the keymaker learned by cut searches and fallback moves,
+    # Manhattan distance for the other flat cells; a lower bound either way
+    def estimate(self, cell):
+        distance = self.learned.get(cell)
+        if distance is None:
+            x, y = divmod(cell, self.grid_size)
+            key_x, key_y = self.keymaker_position
+            return abs(x - key_x) + abs(y - key_y)
+        return distance
+
+    # move of an agent without a path to follow, a real-time search step
+    # (LRTA*): the free neighbor with the lowest estimate. The estimate of
+    # the cell left behind is raised, so repeated fallback moves can not
+    # circle in a dead end, and once it exceeds the number of cells not
+    # known to be dangerous the keymaker is out of reach
+    def fallback_move(self):
+        n = self.grid_size
+        cell = search.to_cell(self.current_position, n)
+        blocked = self.blocked
+        moves = [move for move in search.get_neighbors(n)[cell] if not blocked[move]]
+        if not moves:
+            return None
+        best = min(moves, key=self.estimate)
+        distance = max(self.estimate(cell), self.estimate(best) + 1)
+        self.learned[cell] = distance
+        if distance > self.longest_route():
+            return None
+        return search.to_position(best, n)
+
+    # move of an agent whose search was cut by the deadline: the first flat
+    # cell of the partial path, the search is run again next step. The
+    # estimates are updated as for a fallback move, which is taken instead
+    # when the search got no farther than the current cell
+    def cut_move(self, first):
+        move = self.fallback_move()
+        if move is None or first is None:
+            return move
+        return search.to_position(first, self.grid_size)
+
+    # shortest distance from (0, 0) to the keymaker over the known map,
+    # this is the answer the judge expects at the end of the game
+    def get_shortest_distance(self):
+        return shortest_distance(
+            self.keymaker_position, bytes(self.blocked), self.grid_size
+        )
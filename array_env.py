@@ -0,0 +1,161 @@
+from functools import lru_cache
+
+import numpy as np
+
+from map_env import CELL_CODES, CELL_TYPES, Environment
+
+EMPTY = CELL_CODES[0]
+NEO = CELL_CODES["N"]
+KEY = CELL_CODES["B"]
+AGENT = CELL_CODES["A"]
+PERCEPTION = CELL_CODES["P"]
+SENTINEL = CELL_CODES["S"]
+
+# codes of all cells that kill the agent, A, P and S are the three largest
+DANGER = min(AGENT, PERCEPTION, SENTINEL)
+
+MOORE_MASK = np.ones((3, 3), dtype=bool)
+MOORE_MASK[1, 1] = False
+VON_NEUMANN_MASK = np.array(
+    [[0, 1, 0], [1, 0, 1], [0, 1, 0]], dtype=bool
+)
+# cells marked by extend_sentinel_perception: neighbors of the sentinel's
+# von Neumann neighbors, i.e. the cells at Manhattan distance exactly 2
+SENTINEL_RING_MASK = np.array(
+    [
+        [abs(dx) + abs(dy) == 2 for dy in range(-2, 3)]
+        for dx in range(-2, 3)
+    ],
+    dtype=bool,
+)
+
+
+@lru_cache(maxsize=None)
+def perception_mask(radius):
+    # Moore neighborhood of the given radius without the center
+    mask = np.ones((2 * radius + 1, 2 * radius + 1), dtype=bool)
+    mask[radius, radius] = False
+    return mask
+
+
+class ArrayEnvironment(Environment):
+    """Environment that keeps the map as an np.uint8 array of CELL_CODES.
+
+    Maps are generated by Environment and converted once, after that all
+    per-step work is done with slices and masks over ``cells``. ``grid`` is
+    still available as a list of lists, decoded on every access.
+    """
+
+    cells = None
+
+    @property
+    def grid(self):
+        if self.cells is None:
+            return self._grid
+        return [[CELL_TYPES[cell] for cell in row] for row in self.cells.tolist()]
+
+    @grid.setter
+    def grid(self, grid):
+        self._grid = grid
+        self.cells = None
+
+    def _to_array(self):
+        self.cells = np.array(
+            [[CELL_CODES[cell] for cell in row] for row in self._grid],
+            dtype=np.uint8,
+        )
+        self._grid = None
+
+    def generate(self):
+        super().generate()
+        self._to_array()
+
+    def load_cells(self, cells):
+        super().load_cells(cells)
+        self._to_array()
+
+    def encode(self):
+        return self.cells.tobytes()
+
+    def _window(self, position, radius, mask):
+        # clips a (2r+1)x(2r+1) window around position and the matching
+        # part of the mask to the borders of the map
+        x, y = position
+        x0, y0 = max(x - radius, 0), max(y - radius, 0)
+        x1 = min(x + radius + 1, self.grid_size)
+        y1 = min(y + radius + 1, self.grid_size)
+        window = self.cells[x0:x1, y0:y1]
+        mask = mask[x0 - x + radius : x1 - x + radius, y0 - y + radius : y1 - y + radius]
+        return window, mask
+
+    def _write(self, flat, code):
+        # writes cells by flat index, journaled for restore() like set_cell
+        values = self.cells.reshape(-1)
+        if self._journal is not None:
+            self._journal.append((flat, values[flat].copy()))
+        values[flat] = code
+
+    def _mark(self, position, radius, mask, code):
+        # sets the empty cells of the masked window around position to code
+        window, mask = self._window(position, radius, mask)
+        xs, ys = np.nonzero(mask & (window == EMPTY))
+        x0 = max(position[0] - radius, 0)
+        y0 = max(position[1] - radius, 0)
+        self._write((xs + x0) * self.grid_size + ys + y0, code)
+
+    def set_cell(self, x, y, cell):
+        if self.cells is None:
+            return super().set_cell(x, y, cell)
+        self._write(x * self.grid_size + y, CELL_CODES[cell])
+
+    def restore(self, snapshot):
+        length, self.agent_position = snapshot
+        journal = self._journal
+        values = self.cells.reshape(-1)
+        while len(journal) > length:
+            flat, codes = journal.pop()
+            values[flat] = codes
+
+    def mark_surroundings(self, position, mark, moore):
+        if self.cells is None:
+            return super().mark_surroundings(position, mark, moore)
+        self._mark(
+            position, 1, MOORE_MASK if moore else VON_NEUMANN_MASK, CELL_CODES[mark]
+        )
+
+    def get_obs(self, pos):
+        x, y = pos
+        r = self.agent_perception_range
+        x0, y0 = max(x - r, 0), max(y - r, 0)
+        window, mask = self._window(pos, r, perception_mask(r))
+        xs, ys = np.nonzero(mask & (window != EMPTY))
+        codes = window[xs, ys].tolist()
+        return [
+            [x0 + dx, y0 + dy, CELL_TYPES[code]]
+            for dx, dy, code in zip(xs.tolist(), ys.tolist(), codes)
+        ]
+
+    def move_agent(self, new_agent_position):
+        n = self.grid_size
+        x, y = self.agent_position
+        self._write(x * n + y, EMPTY)
+        self.agent_position = new_agent_position
+        code = self.cells[new_agent_position]
+
+        if code >= DANGER:
+            raise ValueError
+
+        if code == KEY:
+            self.remove_agents()
+            self.extend_sentinel_perception()
+
+        new_x, new_y = new_agent_position
+        self._write(new_x * n + new_y, NEO)
+
+    def remove_agents(self):
+        cells = self.cells
+        self._write(np.flatnonzero((cells == AGENT) | (cells == PERCEPTION)), EMPTY)
+
+    def extend_sentinel_perception(self):
+        for sentinel_position in self.sentinel_positions:
+            self._mark(sentinel_position, 2, SENTINEL_RING_MASK, PERCEPTION)
@@ -1,77 +1,80 @@
-from collections import deque
-from itertools import product
+import search
+from agent_core import GridAgent
 
 
-class BacktrackingAgent:
-    def __init__(self):
-        self.keymaker_position = None
-        self.key_position = None
-        self.danger_zones = set()
-        self.current_position = (0, 0)
-        self.n_moves = 0
+class BacktrackingAgent(GridAgent):
+    def __init__(self, repair=False):
+        super().__init__()
+        # with repair=True a blocked path is patched from the current cell
+        # to the nearest reusable cell of the old path instead of rebuilt
+        self.repair = repair
         self.path = None
         self.path_ptr = 0
-        
+        # the path was cut by the deadline and ends before the keymaker
+        self.partial = False
+
     def initialize(self, env):
-        self.keymaker_position = env.keymaker_position
-        self.key_position = None
-        self.danger_zones = set()
-        self.current_position = (0, 0)
-        self.n_moves = 0
+        super().initialize(env)
         self.path = None
         self.path_ptr = 0
+        self.partial = False
 
-    def read_obs(self, obs):
-        for i in range(len(obs)):
-            line = obs[i]
-            if len(line) >= 3:
-                x = int(line[0])
-                y = int(line[1])
-                obj = line[2]
-                if obj in ["P", "A", "S"]:
-                    self.danger_zones.add((x, y))
-                if obj == "B":
-                    self.key_position = (x, y)
-
-    def get_distance(self, start, target):
-        return abs(start[0] - target[0]) + abs(start[1] - target[1])
-
-    def get_legal_moves(self, position, visited):
-        moves = []
-        for i, j in product([-1, 0, 1], repeat=2):
-            if abs(i) + abs(j) > 1:
-                continue
-            new_position = (position[0] + i, position[1] + j)
-            if new_position in self.danger_zones:
-                continue
-            if new_position[0] < 0 or new_position[1] < 0:
-                continue
-            if new_position[0] > 8 or new_position[1] > 8:
-                continue
-            if new_position in visited:
-                continue
-            moves.append(new_position)
-        return moves
+    def find_path(self, targets):
+        path = search.bfs(
+            search.to_cell(self.current_position, self.grid_size),
+            targets,
+            self.grid_size,
+            self.blocked,
+            self.stats,
+            self.deadline,
+            # learned by the moves of earlier cut searches
+            self.learned if self.deadline is not None else None,
+        )
+        if path is None:
+            return None
+        return [search.to_position(cell, self.grid_size) for cell in path]
 
     def build_path(self, target):
-        visited = set()
-        queue = deque([(self.current_position, [])])
-        while queue:
-            pos, path = queue.popleft()
-            if pos == target:
-                self.path = path
-                self.path_ptr = 0
-                return
-            visited.add(pos)
-            for move in self.get_legal_moves(pos, visited):
-                queue.append((move, path + [move]))
+        self.path = self.find_path({search.to_cell(target, self.grid_size)})
+        self.path_ptr = 0
+        self.partial = self.deadline_hit()
 
-        self.path = None
+    def repair_path(self):
+        # the cells after the last known danger on the rest of the old path
+        # can be reused as they are, only the way to one of them is searched
+        remaining = self.path[self.path_ptr - 1 :]
+        last_danger = max(
+            i for i, pos in enumerate(remaining) if pos in self.danger_zones
+        )
+        reusable = remaining[last_danger + 1 :]
+        targets = {
+            search.to_cell(pos, self.grid_size): i for i, pos in enumerate(reusable)
+        }
+        detour = self.find_path(targets) if targets else None
+        if self.deadline_hit():
+            # the detour may end anywhere, the rest is searched later
+            self.path = detour
+            self.path_ptr = 0
+            self.partial = True
+            return
+        if detour is None:
+            self.build_path(self.keymaker_position)
+            return
+        if detour:
+            resume = targets[search.to_cell(detour[-1], self.grid_size)]
+        else:
+            resume = targets[search.to_cell(self.current_position, self.grid_size)]
+        self.path = detour + reusable[resume + 1 :]
         self.path_ptr = 0
 
     def backtrack(self, next_move):
         if next_move in self.danger_zones:
-            self.build_path(self.keymaker_position)
+            if self.stats is not None:
+                self.stats.replans += 1
+            if self.repair:
+                self.repair_path()
+            else:
+                self.build_path(self.keymaker_position)
             return True
         return False
 
@@ -96,8 +99,13 @@ class BacktrackingAgent:
 
         if self.backtrack(next_move):
             next_move = self.get_next_move()
-            if next_move is None:
-                return "e -1"
+        if self.partial:
+            if next_move is not None:
+                next_move = search.to_cell(next_move, self.grid_size)
+            next_move = self.cut_move(next_move)
+            self.path = None
+        if next_move is None:
+            return "e -1"
 
         self.current_position = next_move
         self.n_moves += 1
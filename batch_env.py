@@ -0,0 +1,120 @@
+import numpy as np
+
+from array_env import AGENT, DANGER, EMPTY, KEY, NEO, PERCEPTION, SENTINEL
+from array_env import ArrayEnvironment
+from map_env import CELL_TYPES
+
+# code of the padding around every map, reads as a deadly cell
+OUTSIDE = 255
+
+SENTINEL_RING_OFFSETS = [
+    (dx, dy)
+    for dx in range(-2, 3)
+    for dy in range(-2, 3)
+    if abs(dx) + abs(dy) == 2
+]
+
+
+def shift(mask, dx, dy):
+    # out[:, x, y] = mask[:, x - dx, y - dy], zero filled at the borders
+    out = np.zeros_like(mask)
+    size_x, size_y = mask.shape[1:]
+    out[:, max(dx, 0) : size_x + min(dx, 0), max(dy, 0) : size_y + min(dy, 0)] = mask[
+        :, max(-dx, 0) : size_x - max(dx, 0), max(-dy, 0) : size_y - max(dy, 0)
+    ]
+    return out
+
+
+class BatchEnvironment:
+    """K independent maps stepped together with the rules of Environment.
+
+    Maps live in one (K, n + 2r, n + 2r) uint8 array of CELL_CODES padded
+    with OUTSIDE by the perception range r. ``step`` takes a (K, 2) array
+    of target positions and returns the (K, 2r + 1, 2r + 1) observation
+    windows, done flags and win flags. Finished maps are replaced right
+    away, their observation is the first one of the new episode.
+    """
+
+    def __init__(self, n_envs, agent_perception_range=1, **env_kwargs):
+        # maps are generated (or read from a corpus) by a single environment
+        self.source = ArrayEnvironment(agent_perception_range, **env_kwargs)
+        self.n_envs = n_envs
+        self.grid_size = self.source.grid_size
+        self.pad = max(agent_perception_range, 1)
+        size = self.grid_size + 2 * self.pad
+        self.cells = np.full((n_envs, size, size), OUTSIDE, dtype=np.uint8)
+        self.positions = np.zeros((n_envs, 2), dtype=np.int64)
+        self.keymaker_positions = np.zeros((n_envs, 2), dtype=np.int64)
+        self.n_moves = np.zeros(n_envs, dtype=np.int64)
+        offsets = np.arange(-self.pad, self.pad + 1)
+        self._dx = offsets[None, :, None]
+        self._dy = offsets[None, None, :]
+
+    def load(self, k):
+        self.source.reset()
+        n, p = self.grid_size, self.pad
+        self.cells[k, p : p + n, p : p + n] = self.source.cells
+        self.positions[k] = self.source.agent_position
+        self.keymaker_positions[k] = self.source.keymaker_position
+        self.n_moves[k] = 0
+
+    def reset(self):
+        for k in range(self.n_envs):
+            self.load(k)
+        return self.observe()
+
+    def observe(self, envs=None):
+        if envs is None:
+            envs = np.arange(self.n_envs)
+        x = self.positions[envs, 0, None, None] + self.pad
+        y = self.positions[envs, 1, None, None] + self.pad
+        return self.cells[envs[:, None, None], x + self._dx, y + self._dy]
+
+    def pick_key(self, envs):
+        cells = self.cells[envs]
+        cells[(cells == AGENT) | (cells == PERCEPTION)] = EMPTY
+        sentinels = cells == SENTINEL
+        ring = np.zeros_like(sentinels)
+        for dx, dy in SENTINEL_RING_OFFSETS:
+            ring |= shift(sentinels, dx, dy)
+        cells[ring & (cells == EMPTY)] = PERCEPTION
+        self.cells[envs] = cells
+
+    def step(self, moves):
+        moves = np.asarray(moves, dtype=np.int64)
+        envs = np.arange(self.n_envs)
+        size = self.cells.shape[1]
+        new = np.clip(moves + self.pad, 0, size - 1)
+        targets = self.cells[envs, new[:, 0], new[:, 1]]
+        lost = (np.abs(moves - self.positions).sum(axis=1) > 1) | (targets >= DANGER)
+
+        moved = envs[~lost]
+        old = self.positions[moved] + self.pad
+        self.cells[moved, old[:, 0], old[:, 1]] = EMPTY
+        key = moved[targets[moved] == KEY]
+        if len(key):
+            self.pick_key(key)
+        self.cells[moved, new[moved, 0], new[moved, 1]] = NEO
+        self.positions[moved] = moves[moved]
+        self.n_moves[moved] += 1
+
+        won = ~lost & (moves == self.keymaker_positions).all(axis=1)
+        done = lost | won
+        obs = self.observe()
+        finished = envs[done]
+        for k in finished:
+            self.load(k)
+        if len(finished):
+            obs[finished] = self.observe(finished)
+        return obs, done, won
+
+    def get_obs(self, k, obs=None):
+        # converts an observation window into the Environment.get_obs format
+        if obs is None:
+            obs = self.observe(np.array([k]))[0]
+        x, y = self.positions[k].tolist()
+        return [
+            [x + dx - self.pad, y + dy - self.pad, CELL_TYPES[code]]
+            for (dx, dy), code in np.ndenumerate(obs)
+            if code != EMPTY and code != OUTSIDE and (dx, dy) != (self.pad, self.pad)
+        ]
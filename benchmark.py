@@ -0,0 +1,146 @@
+import argparse
+import json
+import sys
+from time import perf_counter_ns
+
+from a_star import AStarAgent
+from backtracking import BacktrackingAgent
+from d_star_lite import DStarLiteAgent
+from distance_field import DistanceFieldAgent
+from key_route import KeyRouteAgent
+from map_env import Environment
+
+AGENTS = {
+    "a_star": AStarAgent,
+    "backtracking": BacktrackingAgent,
+    "d_star_lite": DStarLiteAgent,
+    "distance_field": DistanceFieldAgent,
+    "key_route": KeyRouteAgent,
+}
+PHASES = ["reset", "move", "get_obs", "read_obs", "search"]
+PERCENTILES = [50, 90, 99]
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, len(values) * q // 100)]
+
+
+def summarize(values):
+    values = sorted(values)
+    summary = {f"p{q}": percentile(values, q) for q in PERCENTILES}
+    summary["mean"] = sum(values) / len(values)
+    summary["count"] = len(values)
+    return summary
+
+
+def run_case(agent_cls, grid_size, density, n_episodes, seed):
+    """Times every phase of n_episodes games, in nanoseconds per call.
+
+    ``density`` is the share of the map covered by agent zones, every agent
+    with its perception zone covers up to 9 cells. The search phase is the
+    time spent in agent.step minus the time of its read_obs call.
+    """
+    n_agents = max(1, round(density * grid_size * grid_size / 9))
+    env = Environment(seed=seed, grid_size=grid_size, n_agents=n_agents)
+    agent = agent_cls()
+    timings = {phase: [] for phase in PHASES}
+
+    read_obs = agent.read_obs
+    read_time = [0]
+
+    def timed_read_obs(obs):
+        start_t = perf_counter_ns()
+        result = read_obs(obs)
+        read_time[0] += perf_counter_ns() - start_t
+        return result
+
+    agent.read_obs = timed_read_obs
+
+    for _ in range(n_episodes):
+        start_t = perf_counter_ns()
+        env.reset()
+        timings["reset"].append(perf_counter_ns() - start_t)
+        agent.initialize(env)
+        position = env.agent_position
+        for _ in range(4 * grid_size * grid_size):
+            start_t = perf_counter_ns()
+            obs = env.get_obs(position)
+            timings["get_obs"].append(perf_counter_ns() - start_t)
+
+            read_time[0] = 0
+            start_t = perf_counter_ns()
+            action = agent.step(obs)
+            step_time = perf_counter_ns() - start_t
+            timings["read_obs"].append(read_time[0])
+            timings["search"].append(step_time - read_time[0])
+            if type(action) is str:
+                break
+
+            start_t = perf_counter_ns()
+            env.move_agent(action)
+            timings["move"].append(perf_counter_ns() - start_t)
+            position = action
+
+    return {phase: summarize(values) for phase, values in timings.items() if values}
+
+
+def compare(results, baseline, tolerance, metric):
+    regressions = []
+    for case, phases in results.items():
+        for phase, summary in phases.items():
+            reference = baseline.get(case, {}).get(phase)
+            if reference is None:
+                continue
+            if summary[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{case} {phase}: {metric} {summary[metric]:.0f} ns, "
+                    f"baseline {reference[metric]:.0f} ns"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", nargs="+", default=list(AGENTS), choices=AGENTS)
+    parser.add_argument("--grid-sizes", nargs="+", type=int, default=[9, 15, 25])
+    parser.add_argument("--densities", nargs="+", type=float, default=[0.3, 0.5])
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="fail on regressions against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--metric", default="p50")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.agents:
+        for grid_size in args.grid_sizes:
+            for density in args.densities:
+                case = f"{name}/{grid_size}/{density}"
+                results[case] = run_case(
+                    AGENTS[name], grid_size, density, args.episodes, args.seed
+                )
+                print(case)
+                for phase, summary in results[case].items():
+                    print(
+                        f"  {phase:>8}: "
+                        + " ".join(f"p{q}={summary[f'p{q}']}" for q in PERCENTILES)
+                        + " ns"
+                    )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.metric)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
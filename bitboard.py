@@ -0,0 +1,102 @@
+from functools import lru_cache
+
+
+# sets of grid cells stored as bits of a Python int: cell (x, y) of an
+# n x n grid is bit x * n + y. Testing or setting one bit touches the whole
+# int, so boards are only used for whole-board operations (neighbor shifts,
+# flood fills); state tested cell by cell is kept in a bytearray with one
+# byte per flat cell and turned into a board with from_cells when needed
+
+# byte 0 / 1 to the ASCII digit int() reads
+_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def bit(x, y, grid_size):
+    return 1 << (x * grid_size + y)
+
+
+def from_cells(cells):
+    """Board of the cells set to 1 in a bytearray of 0/1 flat cells."""
+    if not cells:
+        return 0
+    # cell 0 is the lowest bit, the last digit of the string
+    return int(bytes(cells).translate(_DIGITS)[::-1], 2)
+
+
+def union(*boards):
+    result = 0
+    for board in boards:
+        result |= board
+    return result
+
+
+def from_positions(positions, grid_size):
+    board = 0
+    for x, y in positions:
+        board |= 1 << (x * grid_size + y)
+    return board
+
+
+def to_positions(board, grid_size):
+    positions = []
+    while board:
+        low = board & -board
+        positions.append(divmod(low.bit_length() - 1, grid_size))
+        board ^= low
+    return positions
+
+
+def popcount(board):
+    return bin(board).count("1")
+
+
+@lru_cache(maxsize=None)
+def masks(grid_size):
+    # full board, and boards without the first / last column
+    full = (1 << grid_size * grid_size) - 1
+    first_column = 0
+    for x in range(grid_size):
+        first_column |= 1 << (x * grid_size)
+    last_column = first_column << (grid_size - 1)
+    return full, full & ~first_column, full & ~last_column
+
+
+def neighbors(board, grid_size):
+    """Cells one von Neumann step away from any cell of ``board``."""
+    full, no_first, no_last = masks(grid_size)
+    return (
+        (board << grid_size)
+        | (board >> grid_size)
+        | ((board & no_last) << 1)
+        | ((board & no_first) >> 1)
+    ) & full
+
+
+def flood_fill(board, free, grid_size):
+    """All cells of ``free`` connected to the cells of ``board``."""
+    reached = board & free
+    while True:
+        grown = reached | neighbors(reached, grid_size) & free
+        if grown == reached:
+            return reached
+        reached = grown
+
+
+def bfs_distance(start, target, grid_size, blocked):
+    """Number of moves between two cells avoiding ``blocked``, or -1.
+
+    Expands the whole frontier with one shift per direction instead of
+    visiting cells one by one.
+    """
+    start_bit = bit(*start, grid_size)
+    target_bit = bit(*target, grid_size)
+    free = masks(grid_size)[0] & ~blocked
+    visited = frontier = start_bit
+    distance = 0
+    while frontier:
+        if frontier & target_bit:
+            return distance
+        frontier = neighbors(frontier, grid_size) & free & ~visited
+        visited |= frontier
+        distance += 1
+    return -1
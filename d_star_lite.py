@@ -0,0 +1,159 @@
+import heapq
+
+import search
+from agent_core import GridAgent
+
+INF = float("inf")
+
+
+class DStarLiteAgent(GridAgent):
+    """Agent that keeps a D* Lite search between steps.
+
+    The search runs backwards from the keymaker, so moving the agent only
+    changes the heuristic offset ``km``, and newly observed danger cells
+    repair just the part of the g-values they invalidate.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reset_search()
+
+    def initialize(self, env):
+        super().initialize(env)
+        self.reset_search()
+
+    def reset_search(self):
+        self.g = {}
+        self.rhs = {}
+        self.queue = []
+        self.queued = {}
+        self.km = 0
+        self.last_position = self.current_position
+        self.started = False
+
+    def get_neighbors(self, position):
+        x, y = position
+        for new_position in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if (
+                0 <= new_position[0] < self.grid_size
+                and 0 <= new_position[1] < self.grid_size
+            ):
+                yield new_position
+
+    def calculate_key(self, position):
+        g = min(self.g.get(position, INF), self.rhs.get(position, INF))
+        return (
+            g + self.get_distance(self.current_position, position) + self.km,
+            g,
+        )
+
+    def push(self, position):
+        key = self.calculate_key(position)
+        self.queued[position] = key
+        heapq.heappush(self.queue, (key, position))
+
+    def top(self):
+        # entries are removed lazily, stale ones are dropped here
+        while self.queue:
+            key, position = self.queue[0]
+            if self.queued.get(position) == key:
+                return key, position
+            heapq.heappop(self.queue)
+        return (INF, INF), None
+
+    def update_vertex(self, position):
+        if position != self.keymaker_position:
+            if position in self.danger_zones:
+                self.rhs[position] = INF
+            else:
+                self.rhs[position] = min(
+                    (
+                        self.g.get(move, INF) + 1
+                        for move in self.get_neighbors(position)
+                        if move not in self.danger_zones
+                    ),
+                    default=INF,
+                )
+        self.queued.pop(position, None)
+        if self.g.get(position, INF) != self.rhs.get(position, INF):
+            self.push(position)
+
+    def compute_shortest_path(self):
+        start = self.current_position
+        expanded = 0
+        while True:
+            key, position = self.top()
+            if position is None or (
+                key >= self.calculate_key(start)
+                and self.rhs.get(start, INF) == self.g.get(start, INF)
+            ):
+                break
+            new_key = self.calculate_key(position)
+            if key < new_key:
+                self.push(position)
+                continue
+            heapq.heappop(self.queue)
+            del self.queued[position]
+            expanded += 1
+            if self.g.get(position, INF) > self.rhs.get(position, INF):
+                self.g[position] = self.rhs[position]
+                for move in self.get_neighbors(position):
+                    self.update_vertex(move)
+            else:
+                self.g[position] = INF
+                self.update_vertex(position)
+                for move in self.get_neighbors(position):
+                    self.update_vertex(move)
+            # the queue survives a cut, the next step goes on from here
+            if self.deadline is not None and self.deadline.expired():
+                break
+
+        if self.stats is not None:
+            self.stats.expanded += expanded
+            self.stats.peak_frontier = max(self.stats.peak_frontier, len(self.queued))
+
+    def update_dangers(self, new_dangers):
+        if self.stats is not None:
+            self.stats.replans += 1
+        self.km += self.get_distance(self.last_position, self.current_position)
+        self.last_position = self.current_position
+        for cell in new_dangers:
+            position = search.to_position(cell, self.grid_size)
+            self.update_vertex(position)
+            for move in self.get_neighbors(position):
+                self.update_vertex(move)
+
+    def get_next_move(self):
+        if self.g.get(self.current_position, INF) == INF:
+            if self.deadline_hit():
+                return self.fallback_move()
+            return None
+        best_move = None
+        best_cost = INF
+        for move in self.get_neighbors(self.current_position):
+            if move in self.danger_zones:
+                continue
+            cost = self.g.get(move, INF) + 1
+            if cost < best_cost:
+                best_move, best_cost = move, cost
+        return best_move
+
+    def step(self, obs):
+        new_dangers = self.read_obs(obs)
+        if self.current_position == self.keymaker_position:
+            return f"e {self.n_moves}"
+
+        if not self.started:
+            self.started = True
+            self.rhs[self.keymaker_position] = 0
+            self.push(self.keymaker_position)
+        elif new_dangers:
+            self.update_dangers(new_dangers)
+        self.compute_shortest_path()
+
+        next_move = self.get_next_move()
+        if next_move is None:
+            return "e -1"
+        self.current_position = next_move
+        self.n_moves += 1
+        return next_move
@@ -0,0 +1,81 @@
+import argparse
+import struct
+
+from map_env import Environment
+
+# file layout: header followed by grid_size ** 4 bytes, for every keymaker
+# cell the hazard frequency of every cell scaled to 0..255
+MAGIC = b"DPRI"
+HEADER = struct.Struct("<4sII")
+SCALE = 255
+
+
+class DangerPrior:
+    """Probability that a cell is dangerous at the start of a game.
+
+    Counted over maps generated by Environment, separately for every
+    keymaker position since the keymaker is placed first and its cell and
+    the cells around it are less likely to hold agents.
+    """
+
+    def __init__(self, grid_size, n_maps, table):
+        self.grid_size = grid_size
+        self.n_maps = n_maps
+        self.table = table
+
+    def probabilities(self, keymaker_position):
+        n_cells = self.grid_size * self.grid_size
+        start = (keymaker_position[0] * self.grid_size + keymaker_position[1]) * n_cells
+        return [value / SCALE for value in self.table[start : start + n_cells]]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.grid_size, self.n_maps))
+            f.write(self.table)
+
+
+def build_prior(n_maps, seed=None, **env_kwargs):
+    env = Environment(seed=seed, **env_kwargs)
+    n_cells = env.grid_size * env.grid_size
+    counts = [[0] * n_cells for _ in range(n_cells)]
+    totals = [0] * n_cells
+    for i in range(n_maps):
+        if i > 0:
+            env.generate()
+        keymaker = env.keymaker_position[0] * env.grid_size + env.keymaker_position[1]
+        row = counts[keymaker]
+        totals[keymaker] += 1
+        hazards, _ = env.hazard_masks()
+        while hazards:
+            low = hazards & -hazards
+            row[low.bit_length() - 1] += 1
+            hazards ^= low
+    table = bytearray()
+    for row, total in zip(counts, totals):
+        table.extend(round(SCALE * count / total) if total else 0 for count in row)
+    return DangerPrior(env.grid_size, n_maps, bytes(table))
+
+
+def load_prior(path):
+    with open(path, "rb") as f:
+        magic, grid_size, n_maps = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a danger prior")
+        table = f.read()
+    if len(table) != grid_size**4:
+        raise ValueError(f"{path} is truncated")
+    return DangerPrior(grid_size, n_maps, table)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--maps", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--grid-size", type=int, default=9)
+    args = parser.parse_args()
+    build_prior(args.maps, args.seed, grid_size=args.grid_size).save(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import heapq
+from collections import deque
+
+import search
+from agent_core import GridAgent
+
+INF = float("inf")
+
+
+class DistanceFieldAgent(GridAgent):
+    """Agent that walks downhill on a distance field rooted at the keymaker.
+
+    The field holds the BFS distance of every cell to the keymaker over
+    the cells not known to be dangerous. It is built once per episode and
+    only the cells whose distance depended on newly seen dangers are
+    recomputed, so a step without new dangers is a lookup of 4 neighbors.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.dist = None
+        # BFS queue of a build that is not finished yet
+        self.queue = None
+
+    def initialize(self, env):
+        super().initialize(env)
+        self.dist = None
+        self.queue = None
+
+    def start_field(self):
+        root = search.to_cell(self.keymaker_position, self.grid_size)
+        self.dist = [INF] * (self.grid_size * self.grid_size)
+        self.dist[root] = 0
+        self.queue = deque([root])
+
+    def build_field(self):
+        # goes on with the build started by start_field; a build cut by the
+        # deadline keeps its queue and labels and continues next step, the
+        # labels it has set are already final BFS distances
+        neighbors = search.get_neighbors(self.grid_size)
+        dist = self.dist
+        queue = self.queue
+        expanded = 0
+        while queue:
+            cell = queue.popleft()
+            expanded += 1
+            for move in neighbors[cell]:
+                if dist[move] == INF and not self.blocked[move]:
+                    dist[move] = dist[cell] + 1
+                    queue.append(move)
+            if self.deadline is not None and self.deadline.expired():
+                break
+        if not queue:
+            self.queue = None
+        if self.stats is not None:
+            self.stats.expanded += expanded
+
+    def update_field(self, new_dangers):
+        if self.stats is not None:
+            self.stats.replans += 1
+        neighbors = search.get_neighbors(self.grid_size)
+        dist = self.dist
+
+        # cells are checked in the order of their old distance: a cell stays
+        # valid while it has a neighbor exactly one step closer to the root
+        queue = []
+        for cell in new_dangers:
+            if dist[cell] == INF:
+                continue
+            dist[cell] = INF
+            for move in neighbors[cell]:
+                if dist[move] != INF:
+                    heapq.heappush(queue, (dist[move], move))
+        invalid = []
+        expanded = 0
+        while queue:
+            cur_dist, cell = heapq.heappop(queue)
+            if dist[cell] != cur_dist or cur_dist == 0:
+                continue
+            expanded += 1
+            if any(dist[move] == cur_dist - 1 for move in neighbors[cell]):
+                continue
+            dist[cell] = INF
+            invalid.append(cell)
+            for move in neighbors[cell]:
+                if dist[move] == cur_dist + 1:
+                    heapq.heappush(queue, (cur_dist + 1, move))
+
+        # invalidated cells are filled again from the valid cells around them
+        for cell in invalid:
+            best = min(dist[move] for move in neighbors[cell]) + 1
+            if best < dist[cell]:
+                dist[cell] = best
+                heapq.heappush(queue, (best, cell))
+        while queue:
+            cur_dist, cell = heapq.heappop(queue)
+            if cur_dist > dist[cell]:
+                continue
+            expanded += 1
+            for move in neighbors[cell]:
+                if cur_dist + 1 < dist[move] and not self.blocked[move]:
+                    dist[move] = cur_dist + 1
+                    heapq.heappush(queue, (cur_dist + 1, move))
+            if self.deadline is not None and self.deadline.expired():
+                # the refill is not final yet, a new build finishes over
+                # the next steps instead
+                self.start_field()
+                break
+        if self.stats is not None:
+            self.stats.expanded += expanded
+
+    def get_next_move(self):
+        cell = search.to_cell(self.current_position, self.grid_size)
+        cur_dist = self.dist[cell]
+        if cur_dist == INF:
+            return None
+        for move in search.get_neighbors(self.grid_size)[cell]:
+            if self.dist[move] == cur_dist - 1:
+                return search.to_position(move, self.grid_size)
+        return None
+
+    def step(self, obs):
+        new_dangers = self.read_obs(obs)
+        if self.current_position == self.keymaker_position:
+            return f"e {self.n_moves}"
+
+        if self.dist is None:
+            self.start_field()
+        elif self.queue is not None:
+            # labels set before a new danger was seen may be too small
+            if any(self.dist[cell] != INF for cell in new_dangers):
+                self.start_field()
+        elif new_dangers:
+            self.update_field(new_dangers)
+        if self.queue is not None:
+            self.build_field()
+
+        next_move = self.get_next_move()
+        if next_move is None and self.queue is not None:
+            next_move = self.fallback_move()
+        if next_move is None:
+            return "e -1"
+        self.current_position = next_move
+        self.n_moves += 1
+        return next_move
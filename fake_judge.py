@@ -0,0 +1,85 @@
+import argparse
+import subprocess
+import sys
+import time
+
+from map_env import Environment
+from protocol import format_obs
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def play_game(cmd, env, agent_perception_range=1):
+    """Plays one game of env against a submission script over pipes.
+
+    Returns the answer reported by the agent (or None if it crashed or
+    walked into a danger), the number of moves and the turn latencies in
+    nanoseconds, measured from the judge's flush to the agent's reply.
+    """
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    keymaker_x, keymaker_y = env.keymaker_position
+    request = f"{agent_perception_range}\n{keymaker_y} {keymaker_x}\n"
+    latencies = []
+    n_moves = 0
+    answer = None
+    try:
+        while True:
+            proc.stdin.write(request.encode())
+            proc.stdin.flush()
+            start_t = time.perf_counter_ns()
+            line = proc.stdout.readline().split()
+            latencies.append(time.perf_counter_ns() - start_t)
+            if not line:
+                break
+            if line[0] == b"e":
+                answer = int(line[1])
+                break
+            position = (int(line[2]), int(line[1]))
+            if position == env.agent_position:
+                obs = env.get_obs(position)
+            else:
+                obs = env.step(position)
+                n_moves += 1
+            request = format_obs(obs)
+    except (ValueError, IndexError, BrokenPipeError):
+        answer = None
+    finally:
+        proc.kill()
+        proc.wait()
+    return answer, n_moves, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--perception", type=int, default=1)
+    args = parser.parse_args()
+
+    env = Environment(args.perception, seed=args.seed)
+    cmd = [sys.executable, args.script]
+    startups = []
+    latencies = []
+    wins = 0
+    for i in range(args.games):
+        if i > 0:
+            env.reset()
+        answer, _, game_latencies = play_game(cmd, env, args.perception)
+        # the first reply of every game includes interpreter startup
+        startups.extend(game_latencies[:1])
+        latencies.extend(game_latencies[1:])
+        if answer is not None and answer != -1:
+            wins += 1
+
+    print(f"games: {args.games}, wins: {wins}")
+    print(f"p50 startup: {percentile(startups, 0.5) / 1e6:.1f} ms")
+    for q in [0.5, 0.9, 0.99]:
+        print(f"p{int(q * 100)} turn latency: {percentile(latencies, q) / 1e3:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
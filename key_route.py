@@ -0,0 +1,295 @@
+import heapq
+
+import search
+from agent_core import GridAgent
+
+INF = float("inf")
+
+# cells extend_sentinel_perception marks around a sentinel
+SENTINEL_RING = [
+    (dx, dy)
+    for dx in range(-2, 3)
+    for dy in range(-2, 3)
+    if abs(dx) + abs(dy) == 2
+]
+
+
+def route_search(
+    start,
+    target,
+    key,
+    grid_size,
+    blocked,
+    blocked_after,
+    stats=None,
+    deadline=None,
+    estimate=None,
+):
+    """A* over (cell, has_key) states between flat cells.
+
+    States are flat cells, offset by grid_size ** 2 once the key is held.
+    Without the key ``blocked`` applies and stepping on ``key`` moves to
+    the second layer, where ``blocked_after`` applies instead. ``start`` is
+    a state, ``key`` is -1 while the key has not been seen. The route
+    straight to the target and the route through the key are compared in
+    this one search. Returns the states of the path without ``start``, or
+    None if the target can not be reached. ``estimate`` maps states to
+    learned distances that replace Manhattan distance. When ``deadline``
+    expires the path to the reached state closest to the target is
+    returned and ``estimate`` is raised for the expanded states of the
+    first layer.
+    """
+    n_cells = grid_size * grid_size
+    neighbors = search.get_neighbors(grid_size)
+    target_x, target_y = divmod(target, grid_size)
+    best_g, parent, closed = search.get_buffers(2 * n_cells)
+
+    def remaining(state):
+        if estimate is not None and state in estimate:
+            return estimate[state]
+        x, y = divmod(state % n_cells, grid_size)
+        return abs(x - target_x) + abs(y - target_y)
+
+    best_g[start] = 0
+    # states with a g-score, reset on the way out
+    touched = [start]
+    # reached state closest to the target, the end of a cut search
+    best_state = start
+    best_h = remaining(start)
+    queue = [(best_h, 0, start)]
+    expanded = 0
+    pushed = 1
+    peak_frontier = 1
+    path = None
+
+    try:
+        while queue:
+            if stats is not None and len(queue) > peak_frontier:
+                peak_frontier = len(queue)
+            _, cur_len, state = heapq.heappop(queue)
+            if closed[state]:
+                continue
+            closed[state] = 1
+            expanded += 1
+            has_key, cell = divmod(state, n_cells)
+            if cell == target:
+                path = search.reconstruct_path(parent, start, state)
+                break
+
+            board = blocked_after if has_key else blocked
+            offset = has_key * n_cells
+            new_len = cur_len + 1
+            for move in neighbors[cell]:
+                if board[move]:
+                    continue
+                new_state = move + n_cells if move == key else move + offset
+                if closed[new_state] or new_len >= best_g[new_state]:
+                    continue
+                if best_g[new_state] == INF:
+                    touched.append(new_state)
+                best_g[new_state] = new_len
+                parent[new_state] = state
+                h = remaining(new_state)
+                if h < best_h:
+                    best_state, best_h = new_state, h
+                heapq.heappush(queue, (new_len + h, new_len, new_state))
+                pushed += 1
+            if deadline is not None and deadline.expired():
+                path = search.reconstruct_path(parent, start, best_state)
+                if estimate is not None:
+                    # estimates are kept for the states of the first layer
+                    first_layer = [state for state in touched if state < n_cells]
+                    f = search.lowest_f(queue, closed)
+                    search.raise_estimates(estimate, f, first_layer, best_g, closed)
+                break
+    finally:
+        for state in touched:
+            best_g[state] = INF
+            parent[state] = -1
+            closed[state] = 0
+
+    if stats is not None:
+        stats.expanded += expanded
+        stats.pushed += pushed
+        stats.peak_frontier = max(stats.peak_frontier, peak_frontier)
+    return path
+
+
+class KeyRouteAgent(GridAgent):
+    """Agent that goes through the key whenever that route is shorter.
+
+    Picking up the key clears every agent and its perception zone and puts
+    perception cells around the sentinels. The agent plans over both
+    phases with route_search and keeps the plan until a new danger lies
+    on it, or until the key is seen and a route through it becomes
+    possible. Dangers after the pickup are predicted from the sentinels
+    seen so far; the predictions are only used for routing, ``blocked``
+    and ``danger_zones`` hold the dangers seen since the pickup.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reset_route()
+
+    def initialize(self, env):
+        super().initialize(env)
+        self.reset_route()
+
+    def reset_route(self):
+        self.sentinels = set()
+        self.has_key = False
+        # dangers seen before the pickup, set once the key is held
+        self.blocked_before = None
+        self.path = None
+        self.path_ptr = 0
+        # the path was cut by the deadline and ends before the keymaker
+        self.partial = False
+
+    def read_obs(self, obs):
+        new_dangers = super().read_obs(obs)
+        for line in obs:
+            if len(line) >= 3 and line[2] == "S":
+                self.sentinels.add((int(line[0]), int(line[1])))
+        return new_dangers
+
+    def blocked_after(self):
+        # known sentinels and the cells extend_sentinel_perception marks,
+        # the keymaker and the key itself are never marked; once the key is
+        # held the dangers seen since the pickup are added
+        n = self.grid_size
+        board = bytearray(self.blocked) if self.has_key else bytearray(n * n)
+        for sent_x, sent_y in self.sentinels:
+            board[sent_x * n + sent_y] = 1
+            for dx, dy in SENTINEL_RING:
+                x, y = sent_x + dx, sent_y + dy
+                if (
+                    0 <= x < n
+                    and 0 <= y < n
+                    and (x, y) != self.keymaker_position
+                    and (x, y) != self.key_position
+                ):
+                    board[x * n + y] = 1
+        return board
+
+    def hazards(self):
+        # boards of both layers for routing, once the key is held the
+        # dangers are the ones after the pickup
+        if self.has_key:
+            blocked_after = self.blocked_after()
+            return blocked_after, blocked_after
+        return self.blocked, self.blocked_after()
+
+    def longest_route(self):
+        # a route through the key may visit every cell once on each layer
+        if self.has_key or self.key_position is None:
+            return super().longest_route()
+        return 2 * super().longest_route()
+
+    def pick_key(self):
+        # remove_agents cleared every A and P, the dangers seen from now on
+        # are the ones after the pickup
+        self.has_key = True
+        self.blocked_before = self.blocked
+        self.blocked = bytearray(self.grid_size * self.grid_size)
+        self.danger_zones = set()
+        # learned over the dangers before the pickup, some of them are gone
+        self.learned = {}
+
+    def get_shortest_distance(self):
+        # the answer for the judge goes through the key when that is
+        # shorter; once the key is held both layers are the dangers seen,
+        # before that the layer after the pickup is the predicted one
+        n = self.grid_size
+        key = -1
+        if self.key_position is not None:
+            key = search.to_cell(self.key_position, n)
+        if self.has_key:
+            before = self.blocked_before
+            after = bytearray(n * n)
+            for sent_x, sent_y in self.sentinels:
+                after[sent_x * n + sent_y] = 1
+            for cell, hit in enumerate(self.blocked):
+                if hit:
+                    after[cell] = 1
+        else:
+            before, after = self.blocked, self.blocked_after()
+        path = route_search(
+            0, search.to_cell(self.keymaker_position, n), key, n, before, after
+        )
+        return -1 if path is None else len(path)
+
+    def plan(self):
+        if self.stats is not None:
+            self.stats.replans += 1
+        # once the key is held the route stays on the first layer, with the
+        # dangers after the pickup, so the learned estimates match its states
+        n = self.grid_size
+        start = search.to_cell(self.current_position, n)
+        key = -1
+        if self.key_position is not None and not self.has_key:
+            key = search.to_cell(self.key_position, n)
+        blocked, blocked_after = self.hazards()
+        self.path = route_search(
+            start,
+            search.to_cell(self.keymaker_position, n),
+            key,
+            n,
+            blocked,
+            blocked_after,
+            self.stats,
+            self.deadline,
+            # learned by the moves of earlier cut searches
+            self.learned if self.deadline is not None else None,
+        )
+        self.path_ptr = 0
+        self.partial = self.deadline_hit()
+
+    def path_blocked(self):
+        n_cells = self.grid_size * self.grid_size
+        blocked, blocked_after = self.hazards()
+        for state in self.path[self.path_ptr :]:
+            if state < n_cells:
+                if blocked[state]:
+                    return True
+            elif blocked_after[state - n_cells]:
+                return True
+        return False
+
+    def step(self, obs):
+        picked = (
+            not self.has_key
+            and self.key_position is not None
+            and self.current_position == self.key_position
+        )
+        if picked:
+            self.pick_key()
+        key_seen = self.key_position is not None
+        new_dangers = self.read_obs(obs)
+        if self.current_position == self.keymaker_position:
+            return f"e {self.n_moves}"
+
+        if (
+            self.path is None
+            or picked
+            or (not key_seen and self.key_position is not None)
+            or (new_dangers and self.path_blocked())
+        ):
+            self.plan()
+        if self.partial:
+            first = None
+            if self.path:
+                first = self.path[0] % (self.grid_size * self.grid_size)
+            next_move = self.cut_move(first)
+            self.path = None
+        elif self.path and self.path_ptr < len(self.path):
+            cell = self.path[self.path_ptr] % (self.grid_size * self.grid_size)
+            self.path_ptr += 1
+            next_move = search.to_position(cell, self.grid_size)
+        else:
+            next_move = None
+        if next_move is None:
+            return "e -1"
+
+        self.current_position = next_move
+        self.n_moves += 1
+        return next_move
@@ -1,58 +1,39 @@
 from a_star import AStarAgent
 from backtracking import BacktrackingAgent
 from map_env import Environment
+from collections import deque
+from functools import partial
+from itertools import islice
+import argparse
+import os
+import sys
 import time
-import signal
-import pandas as pd
+from results import EpisodeWriter, ExperimentAggregator, write_results
+from search import Deadline
+
+# upper bound of episodes per worker task, keeps per-chunk records small
+MAX_CHUNK_SIZE = 10000
+UNSOLVABLE_MODES = ["keep", "flag", "skip", "regenerate"]
+# seconds an episode may take before it is played again with another map
+EPISODE_TIME_LIMIT = 1.0
 
 
 class TimeoutException(Exception):
     pass
 
 
-def timeout(seconds):
-    def decorator(func):
-        def _handle_timeout(signum, frame):
-            raise TimeoutException(
-                f"Function {func.__name__} timed out after {seconds} seconds"
-            )
-
-        def wrapper(*args, **kwargs):
-            signal.signal(signal.SIGALRM, _handle_timeout)
-            signal.alarm(seconds)
-            try:
-                result = func(*args, **kwargs)
-            finally:
-                signal.alarm(0)
-            return result
-
-        return wrapper
-
-    return decorator
-
-
-def mean(lst):
-    return sum(lst) / len(lst)
-
-
-def var(lst):
-    m = mean(lst)
-    return sum([(x - m) ** 2 for x in lst]) / len(lst)
-
-
-def std(lst):
-    return var(lst) ** 0.5
-
-
-@timeout(1)
-def run_experiment(agent, env):
-    obs = env.reset()
+def run_experiment(agent, env, obs=None, time_limit=EPISODE_TIME_LIMIT):
+    # obs is the first observation of an already reset environment
+    if obs is None:
+        obs = env.reset()
     agent.initialize(env)
     done = False
     n_moves = 0
 
     no_errs = True
     start_t = time.time()
+    # checked between moves, a single move is bounded by the agent deadline
+    expires = time.perf_counter() + time_limit
 
     try:
         while not done:
@@ -63,6 +44,10 @@ def run_experiment(agent, env):
                 break
             else:
                 obs = env.step(action)
+            if time.perf_counter() > expires:
+                raise TimeoutException(
+                    f"episode timed out after {time_limit} seconds"
+                )
     except Exception:
         action = "e -1"
         no_errs = False
@@ -78,42 +63,322 @@ def run_experiment(agent, env):
     return no_errs, exec_time, win, n_moves
 
 
-def run_experiments(exp_id, agent, env, n_experiments):
-    exec_times = []
-    wins = []
-    moves_count = []
-    iters = 0
-    while iters < n_experiments:
-        success, exec_time, win, n_moves = run_experiment(agent, env)
-        if not success:
+def episode_seed(seed, episode, attempt):
+    # every (episode, attempt) pair gets its own map, so the sequence of
+    # played maps does not depend on how episodes are split between workers
+    return f"{seed}:{episode}:{attempt}"
+
+
+def run_episodes(
+    agent,
+    env,
+    start,
+    stop,
+    seed=None,
+    instrument=False,
+    on_episode=None,
+    quantiles=False,
+    unsolvable="keep",
+    deadline=None,
+):
+    """Plays episodes [start, stop) and aggregates their results.
+
+    ``unsolvable`` decides what happens to maps where the keymaker cannot
+    be reached: "keep" plays them unchecked, "flag" plays them and reports
+    win fractions over solvable maps too, "skip" drops the episode and
+    "regenerate" replaces the map with the next attempt of the episode.
+    ``deadline`` is a search.Deadline the agent gets as per move budget.
+    """
+    if unsolvable not in UNSOLVABLE_MODES:
+        raise ValueError(f"unsolvable must be one of {UNSOLVABLE_MODES}")
+    aggregator = ExperimentAggregator(quantiles)
+    counters = None
+    if instrument:
+        agent.enable_stats()
+    if deadline is not None:
+        agent.set_deadline(deadline)
+    for episode in range(start, stop):
+        attempt = 0
+        solvable = None
+        while True:
+            if seed is not None:
+                env.rng.seed(episode_seed(seed, episode, attempt))
+            obs = None
+            if unsolvable != "keep":
+                obs = env.reset()
+                solvable = env.is_solvable()
+                if not solvable and unsolvable == "regenerate":
+                    aggregator.add_regenerated()
+                    attempt += 1
+                    continue
+                if not solvable and unsolvable == "skip":
+                    break
+            if instrument:
+                agent.stats.reset()
+            success, exec_time, win, n_moves = run_experiment(agent, env, obs)
+            if success:
+                break
+            attempt += 1
+        if solvable is False and unsolvable == "skip":
+            aggregator.add_skipped()
             continue
-        wins.append(win)
-        exec_times.append(exec_time)
-        moves_count.append(n_moves)
-        iters += 1
-
-    return {
-        "exp_id": exp_id,
-        "mean_exec_time": mean(exec_times),
-        "std_exec_time": std(exec_times),
-        "var_exec_time": var(exec_times),
-        "mean_moves": mean(moves_count),
-        "std_moves": std(moves_count),
-        "var_moves": var(moves_count),
-        "win_fraction": mean(wins),
-    }
+        if instrument:
+            counters = agent.stats.as_dict()
+        aggregator.add(exec_time, win, n_moves, counters, solvable)
+        if on_episode is not None:
+            record = {
+                "episode": episode,
+                "exec_time": exec_time,
+                "win": win,
+                "n_moves": n_moves,
+            }
+            if solvable is not None:
+                record["solvable"] = int(solvable)
+            if counters:
+                record.update(counters)
+            on_episode(record)
+
+    return aggregator
+
+
+def episode_recorder(writer, exp_id):
+    if writer is None:
+        return None
+
+    def on_episode(record):
+        writer.write({"exp_id": exp_id, **record})
+
+    return on_episode
+
+
+def run_experiments(
+    exp_id,
+    agent,
+    env,
+    n_experiments,
+    seed=None,
+    instrument=False,
+    writer=None,
+    quantiles=False,
+    unsolvable="keep",
+    deadline=None,
+):
+    aggregator = run_episodes(
+        agent,
+        env,
+        0,
+        n_experiments,
+        seed,
+        instrument,
+        episode_recorder(writer, exp_id),
+        quantiles,
+        unsolvable,
+        deadline,
+    )
+    return aggregator.summary(exp_id)
+
+
+def _run_chunk(
+    agent_cls, seed, start, stop, instrument, record, quantiles, unsolvable, deadline
+):
+    records = [] if record else None
+    aggregator = run_episodes(
+        agent_cls(),
+        Environment(),
+        start,
+        stop,
+        seed,
+        instrument,
+        records.append if record else None,
+        quantiles,
+        unsolvable,
+        deadline,
+    )
+    return aggregator, records
+
+
+def run_experiments_parallel(
+    exp_id,
+    agent_cls,
+    n_experiments,
+    seed=0,
+    n_workers=None,
+    chunk_size=None,
+    instrument=False,
+    writer=None,
+    quantiles=False,
+    unsolvable="keep",
+    deadline=None,
+):
+    # worker pools are only needed here, their import is most of the startup
+    from concurrent.futures import ProcessPoolExecutor
+
+    n_workers = n_workers or os.cpu_count()
+    if chunk_size is None:
+        chunk_size = min(
+            MAX_CHUNK_SIZE, max(1, -(-n_experiments // (n_workers * 4)))
+        )
+
+    on_episode = episode_recorder(writer, exp_id)
+    aggregator = ExperimentAggregator(quantiles)
+    starts = iter(range(0, n_experiments, chunk_size))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+
+        def submit(start):
+            return executor.submit(
+                _run_chunk,
+                agent_cls,
+                seed,
+                start,
+                min(start + chunk_size, n_experiments),
+                instrument,
+                writer is not None,
+                quantiles,
+                unsolvable,
+                deadline,
+            )
+
+        # a bounded window of chunks is in flight and every future is
+        # dropped once merged, so finished records do not pile up
+        pending = deque(submit(start) for start in islice(starts, 2 * n_workers))
+        # chunks are merged in episode order, so the results
+        # are the same as for run_experiments with the same seed
+        while pending:
+            chunk_aggregator, records = pending.popleft().result()
+            start = next(starts, None)
+            if start is not None:
+                pending.append(submit(start))
+            aggregator.merge(chunk_aggregator)
+            if on_episode is not None:
+                for record in records:
+                    on_episode(record)
+            records = None
+
+    return aggregator.summary(exp_id)
+
+
+def report_import_time(module, top=10):
+    # a fresh interpreter, the imports of this one are done already
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    times = []
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        # nested imports are indented by two spaces per level
+        if not name[1:].startswith(" "):
+            total += int(cumulative_us)
+        times.append((int(cumulative_us), int(self_us), name.strip()))
+    print(f"import {module}: {total / 1000:.1f} ms")
+    for cumulative_us, self_us, name in sorted(times, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:7.1f} ms  {self_us / 1000:6.1f} ms self  {name}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--instrument", action="store_true")
+    parser.add_argument("--quantiles", action="store_true")
+    parser.add_argument(
+        "--unsolvable",
+        choices=UNSOLVABLE_MODES,
+        default="keep",
+        help="what to do with maps where the keymaker cannot be reached",
+    )
+    parser.add_argument(
+        "--move-time", type=float, default=None, help="search budget per move, s"
+    )
+    parser.add_argument(
+        "--max-expansions", type=int, default=None, help="expanded nodes per move"
+    )
+    parser.add_argument(
+        "--prior", help="danger prior file, A* then penalizes likely dangers"
+    )
+    parser.add_argument(
+        "--pandas", action="store_true", help="write results.csv with pandas"
+    )
+    parser.add_argument(
+        "--importtime",
+        nargs="?",
+        const="main",
+        metavar="MODULE",
+        help="report the import time of a module (default main) and exit",
+    )
+    parser.add_argument(
+        "--episodes-out", help="stream per-episode records to a .csv or .parquet"
+    )
+    return parser.parse_args()
 
 
 def main():
-    env = Environment()
-    a_star_agent = AStarAgent()
-    backtracking_agent = BacktrackingAgent()
+    args = parse_args()
+    if args.importtime:
+        report_import_time(args.importtime)
+        return
+    writer = EpisodeWriter(args.episodes_out) if args.episodes_out else None
+    options = {
+        "instrument": args.instrument,
+        "writer": writer,
+        "quantiles": args.quantiles,
+        "unsolvable": args.unsolvable,
+        "deadline": None,
+    }
+    if args.move_time is not None or args.max_expansions is not None:
+        options["deadline"] = Deadline(args.move_time, args.max_expansions)
+    prior = None
+    if args.prior:
+        from danger_prior import load_prior
+
+        prior = load_prior(args.prior)
+    if args.workers > 1:
+        seed = 0 if args.seed is None else args.seed
+        a_star_data = run_experiments_parallel(
+            "a_star",
+            partial(AStarAgent, prior),
+            args.episodes,
+            seed,
+            args.workers,
+            **options,
+        )
+        backtracking_data = run_experiments_parallel(
+            "backtracking",
+            BacktrackingAgent,
+            args.episodes,
+            seed,
+            args.workers,
+            **options,
+        )
+    else:
+        env = Environment()
+        a_star_agent = AStarAgent(prior)
+        backtracking_agent = BacktrackingAgent()
 
-    a_star_data = run_experiments("a_star", a_star_agent, env, 1000)
-    backtracking_data = run_experiments("backtracking", backtracking_agent, env, 1000)
+        a_star_data = run_experiments(
+            "a_star", a_star_agent, env, args.episodes, args.seed, **options
+        )
+        backtracking_data = run_experiments(
+            "backtracking",
+            backtracking_agent,
+            env,
+            args.episodes,
+            args.seed,
+            **options,
+        )
+    if writer is not None:
+        writer.close()
 
-    df = pd.DataFrame([a_star_data, backtracking_data]).T
-    df.to_csv("results.csv", index=True, header=False)
+    write_results("results.csv", [a_star_data, backtracking_data], args.pandas)
 
 
 if __name__ == "__main__":
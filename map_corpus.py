@@ -0,0 +1,73 @@
+import argparse
+import mmap
+import struct
+
+from map_env import Environment
+
+# file layout: header followed by n_maps blocks of grid_size * grid_size
+# bytes, one byte per cell encoded with map_env.CELL_CODES
+MAGIC = b"MAPC"
+HEADER = struct.Struct("<4sII")
+
+
+def generate_corpus(path, n_maps, seed=None, **env_kwargs):
+    env = Environment(seed=seed, **env_kwargs)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, env.grid_size, n_maps))
+        for i in range(n_maps):
+            if i > 0:
+                env.generate()
+            f.write(env.encode())
+
+
+class MapCorpus:
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.grid_size, self.n_maps = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a map corpus")
+        self.map_bytes = self.grid_size * self.grid_size
+
+    def __len__(self):
+        return self.n_maps
+
+    def __getitem__(self, map_index):
+        if not 0 <= map_index < self.n_maps:
+            raise IndexError(map_index)
+        offset = HEADER.size + map_index * self.map_bytes
+        return self._mmap[offset : offset + self.map_bytes]
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # the mapping itself can not be pickled, workers reopen the file
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--maps", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_corpus(args.path, args.maps, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,12 @@
 import random
-from itertools import product
+from functools import lru_cache
+
+import bitboard
+
+MOORE_OFFSETS = tuple(
+    (dx, dy) for dx in range(-1, 2) for dy in range(-1, 2) if dx != 0 or dy != 0
+)
+VON_NEUMANN_OFFSETS = ((0, 1), (0, -1), (1, 0), (-1, 0))
 
 
 def moore_distance(x1, y1, x2, y2):
@@ -10,66 +17,250 @@ def manhattan_distance(x1, y1, x2, y2):
     return abs(x1 - x2) + abs(y1 - y2)
 
 
+@lru_cache(maxsize=None)
+def distance_offsets(distance_check, min_distance):
+    # offsets of all cells within min_distance under distance_check,
+    # valid for metrics that are never smaller than the Moore distance
+    return tuple(
+        (dx, dy)
+        for dx in range(-min_distance, min_distance + 1)
+        for dy in range(-min_distance, min_distance + 1)
+        if distance_check(0, 0, dx, dy) <= min_distance
+    )
+
+
+@lru_cache(maxsize=None)
+def perception_offsets(radius, left, right, down, up):
+    # Moore stencil of the given radius without the center, clipped to the
+    # cells the map has on each side of the agent; positions with the same
+    # border class share one stencil
+    return tuple(
+        (dx, dy)
+        for dx in range(-min(left, radius), min(right, radius) + 1)
+        for dy in range(-min(down, radius), min(up, radius) + 1)
+        if dx != 0 or dy != 0
+    )
+
+
+class FreeCells:
+    """Flat indices of the cells that are not taken yet.
+
+    Sparse Fisher-Yates shuffle: only swapped slots are stored, so creating
+    it costs O(1) regardless of the map size and every draw costs O(1).
+    """
+
+    def __init__(self, n_cells):
+        self.size = n_cells
+        self._slot_cell = {}
+        self._cell_slot = {}
+
+    def _cell(self, slot):
+        return self._slot_cell.get(slot, slot)
+
+    def _swap(self, i, j):
+        a, b = self._cell(i), self._cell(j)
+        self._slot_cell[i] = b
+        self._cell_slot[b] = i
+        self._slot_cell[j] = a
+        self._cell_slot[a] = j
+
+    def remove(self, cell):
+        slot = self._cell_slot.get(cell, cell)
+        if slot < self.size:
+            self._swap(slot, self.size - 1)
+            self.size -= 1
+
+    def sample(self, rng, accept=None):
+        n = self.size
+        while n:
+            slot = rng.randrange(n)
+            cell = self._cell(slot)
+            if accept is None or accept(cell):
+                self._swap(slot, self.size - 1)
+                self.size -= 1
+                return cell
+            # a rejected cell stays free, it is only excluded from this draw
+            n -= 1
+            self._swap(slot, n)
+        raise ValueError("no free cell satisfies the placement constraints")
+
+
+# compact one byte encoding of grid cells, used by the map corpus
+CELL_CODES = {0: 0, "N": 1, "K": 2, "B": 3, "A": 4, "P": 5, "S": 6}
+CELL_TYPES = {code: cell for cell, code in CELL_CODES.items()}
+
+
 class Environment:
-    def __init__(self, agent_perception_range=1):
+    def __init__(
+        self,
+        agent_perception_range=1,
+        seed=None,
+        rng=None,
+        corpus=None,
+        grid_size=9,
+        n_agents=3,
+        n_sentinels=1,
+    ):
         self.agent_perception_range = agent_perception_range
-        self.grid_size = 9
+        self.grid_size = grid_size if corpus is None else corpus.grid_size
+        self.max_agents = n_agents
+        self.n_sentinels = n_sentinels
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.corpus = corpus
+        self.map_index = -1
+        if corpus is None:
+            self.generate()
+        else:
+            self.load_map(0)
+            # map 0 is also the one the first reset() plays
+            self.map_index = -1
+
+    def generate(self):
         self.grid = [[0] * self.grid_size for _ in range(self.grid_size)]
         self.taken_positions = []
+        self._taken = set()
+        self._free = FreeCells(self.grid_size * self.grid_size)
+        self._journal = None
 
         self.keymaker_position = self.place_entity("K")
         self.agent_position = (0, 0)
         self.grid[0][0] = "N"
-        self.taken_positions.append(self.agent_position)
+        self.take_position(self.agent_position)
 
-        self.n_agents = random.randint(3, 3)
+        # always max_agents, the draw only keeps the random stream of the
+        # original randint(3, 3) so seeded maps and corpora stay the same
+        self.n_agents = self.rng.randint(self.max_agents, self.max_agents)
         for _ in range(self.n_agents):
             agent_position = self.place_entity(
                 "A", distance_check=moore_distance, min_distance=1
             )
             self.mark_surroundings(agent_position, "P", moore=True)
 
-        self.place_entity("S", distance_check=manhattan_distance, min_distance=1)
-        self.sentinel_position = self.taken_positions[-1]
-        self.mark_surroundings(self.taken_positions[-1], "P", moore=False)
+        self.sentinel_positions = []
+        for _ in range(self.n_sentinels):
+            sentinel_position = self.place_entity(
+                "S", distance_check=manhattan_distance, min_distance=1
+            )
+            self.sentinel_positions.append(sentinel_position)
+            self.mark_surroundings(sentinel_position, "P", moore=False)
+        self.sentinel_position = self.sentinel_positions[0]
+
+        self.key_position = self.place_entity(
+            "B", distance_check=manhattan_distance, min_distance=1
+        )
+        self._solvable = None
+
+    def take_position(self, position):
+        self.taken_positions.append(position)
+        self._taken.add(position)
+        self._free.remove(position[0] * self.grid_size + position[1])
 
-        self.place_entity("B", distance_check=manhattan_distance, min_distance=1)
+    def is_too_close(self, x, y, distance_check, min_distance):
+        offsets = distance_offsets(distance_check, min_distance)
+        if len(offsets) > len(self.taken_positions):
+            return any(
+                distance_check(x, y, pos[0], pos[1]) <= min_distance
+                for pos in self.taken_positions
+            )
+        taken = self._taken
+        return any((x + dx, y + dy) in taken for dx, dy in offsets)
 
     def place_entity(self, entity, distance_check=None, min_distance=0):
-        x, y = self.get_random_position()
-        while distance_check and any(
-            distance_check(x, y, pos[0], pos[1]) <= min_distance
-            for pos in self.taken_positions
-        ):
-            x, y = self.get_random_position()
+        accept = None
+        if distance_check:
+            def accept(cell):
+                x, y = divmod(cell, self.grid_size)
+                return not self.is_too_close(x, y, distance_check, min_distance)
+
+        x, y = divmod(self._free.sample(self.rng, accept), self.grid_size)
         self.grid[x][y] = entity
         position = (x, y)
-        self.taken_positions.append(position)
+        self.take_position(position)
         return position
 
-    def get_random_position(self):
-        return random.randint(0, self.grid_size - 1), random.randint(
-            0, self.grid_size - 1
-        )
-
     def mark_surroundings(self, position, mark, moore):
         x, y = position
-        directions = (
-            product(range(-1, 2), range(-1, 2))
-            if moore
-            else [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        )
-        for dx, dy in directions:
-            if (dx, dy) == (0, 0):
-                continue
+        for dx, dy in MOORE_OFFSETS if moore else VON_NEUMANN_OFFSETS:
             if (
                 0 <= x + dx < self.grid_size
                 and 0 <= y + dy < self.grid_size
                 and self.grid[x + dx][y + dy] == 0
             ):
-                self.grid[x + dx][y + dy] = mark
-                
-                
+                self.set_cell(x + dx, y + dy, mark)
+
+    def set_cell(self, x, y, cell):
+        # every change of a played map goes through here to be undoable
+        if self._journal is not None:
+            self._journal.append((x, y, self.grid[x][y]))
+        self.grid[x][y] = cell
+
+    def snapshot(self):
+        """Marks the current state of the map for restore().
+
+        Cell changes made after the first snapshot are journaled, so a
+        restore undoes only what changed since instead of copying the grid.
+        Snapshots nest, restoring one invalidates those taken after it.
+        """
+        if self._journal is None:
+            self._journal = []
+        return len(self._journal), self.agent_position
+
+    def restore(self, snapshot):
+        length, self.agent_position = snapshot
+        journal = self._journal
+        grid = self.grid
+        while len(journal) > length:
+            x, y, cell = journal.pop()
+            grid[x][y] = cell
+
+    def hazard_masks(self):
+        """Bitboards of the deadly cells before and after the key pickup.
+
+        After the pickup remove_agents has cleared every A and P cell and
+        extend_sentinel_perception has marked the empty cells at Manhattan
+        distance 2 from each sentinel; the start cell is empty by then.
+        """
+        n = self.grid_size
+        grid = self.grid
+        before = bytearray(n * n)
+        after = bytearray(n * n)
+        for x in range(n):
+            for y in range(n):
+                if grid[x][y] in ["A", "P", "S"]:
+                    before[x * n + y] = 1
+        for sent_x, sent_y in self.sentinel_positions:
+            after[sent_x * n + sent_y] = 1
+            for dx, dy in distance_offsets(manhattan_distance, 2):
+                x, y = sent_x + dx, sent_y + dy
+                if (
+                    abs(dx) + abs(dy) == 2
+                    and 0 <= x < n
+                    and 0 <= y < n
+                    and grid[x][y] in [0, "A", "P", "N"]
+                ):
+                    after[x * n + y] = 1
+        return bitboard.from_cells(before), bitboard.from_cells(after)
+
+    def is_solvable(self):
+        # computed once per map, the map does not change before it is played
+        if self._solvable is None:
+            n = self.grid_size
+            before, after = self.hazard_masks()
+            full = bitboard.masks(n)[0]
+            keymaker = bitboard.bit(*self.keymaker_position, n)
+            key = 0
+            if self.key_position is not None:
+                key = bitboard.bit(*self.key_position, n)
+            # stepping on B picks the key up, so B ends the first flood
+            reached = bitboard.flood_fill(
+                bitboard.bit(*self.agent_position, n), full & ~before & ~key, n
+            )
+            self._solvable = bool(reached & keymaker)
+            if not self._solvable and key:
+                if bitboard.neighbors(reached, n) & key:
+                    reached = bitboard.flood_fill(key, full & ~after, n)
+                    self._solvable = bool(reached & keymaker)
+        return self._solvable
 
     def step(self, new_agent_position):
         if manhattan_distance(*new_agent_position, *self.agent_position) > 1:
@@ -82,20 +273,66 @@ class Environment:
     
     def get_obs(self, pos):
         x, y = pos
+        r = self.agent_perception_range
+        last = self.grid_size - 1
+        grid = self.grid
         obs = []
-        for dx, dy in product(range(-1, 2), range(-1, 2)):
-            if 0 <= x + dx < self.grid_size and 0 <= y + dy < self.grid_size and self.grid[x + dx][y + dy] != 0 and (dx != 0 or dy != 0): 
-                obs.append([x + dx, y + dy, self.grid[x + dx][y + dy]])
-                
+        for dx, dy in perception_offsets(
+            r, min(x, r), min(last - x, r), min(y, r), min(last - y, r)
+        ):
+            cell = grid[x + dx][y + dy]
+            if cell != 0:
+                obs.append([x + dx, y + dy, cell])
         return obs
 
-    def reset(self):
-        self.__init__()
+    def reset(self, map_index=None):
+        if self.corpus is None:
+            self.generate()
+        elif map_index is None:
+            self.load_map((self.map_index + 1) % len(self.corpus))
+        else:
+            self.load_map(map_index)
         return self.get_obs((0, 0))
 
+    def load_map(self, map_index):
+        self.map_index = map_index
+        self.load_cells(self.corpus[map_index])
+
+    def encode(self):
+        return bytes(CELL_CODES[cell] for row in self.grid for cell in row)
+
+    def load_cells(self, cells):
+        n = self.grid_size
+        self.grid = [[CELL_TYPES[cells[x * n + y]] for y in range(n)] for x in range(n)]
+        self.taken_positions = []
+        self.sentinel_positions = []
+        self.key_position = None
+        self.n_agents = 0
+        self._solvable = None
+        self._journal = None
+        # a keymaker placed on the start cell is hidden under "N"
+        self.keymaker_position = (0, 0)
+        for i in range(n * n):
+            x, y = divmod(i, n)
+            cell = self.grid[x][y]
+            if cell in [0, "P"]:
+                continue
+            self.taken_positions.append((x, y))
+            if cell == "N":
+                self.agent_position = (x, y)
+            elif cell == "K":
+                self.keymaker_position = (x, y)
+            elif cell == "S":
+                self.sentinel_positions.append((x, y))
+            elif cell == "B":
+                self.key_position = (x, y)
+            elif cell == "A":
+                self.n_agents += 1
+        self.sentinel_position = self.sentinel_positions[0]
+
     def move_agent(self, new_agent_position):
         x, y = self.agent_position
-        self.grid[x][y] = 0
+        self.set_cell(x, y, 0)
         self.agent_position = new_agent_position
         new_x, new_y = new_agent_position
 
@@ -106,27 +343,27 @@ class Environment:
             self.remove_agents()
             self.extend_sentinel_perception()
 
-        self.grid[new_x][new_y] = "N"
+        self.set_cell(new_x, new_y, "N")
 
     def remove_agents(self):
         for x in range(self.grid_size):
             for y in range(self.grid_size):
                 if self.grid[x][y] in ["A", "P"]:
-                    self.grid[x][y] = 0
+                    self.set_cell(x, y, 0)
 
     def extend_sentinel_perception(self):
-        sent_x, sent_y = self.sentinel_position
-        for pos in [
-            (sent_x - 1, sent_y),
-            (sent_x + 1, sent_y),
-            (sent_x, sent_y - 1),
-            (sent_x, sent_y + 1),
-        ]:
-            if 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size:
-                self.mark_surroundings(pos, "P", moore=False)
+        for sent_x, sent_y in self.sentinel_positions:
+            for pos in [
+                (sent_x - 1, sent_y),
+                (sent_x + 1, sent_y),
+                (sent_x, sent_y - 1),
+                (sent_x, sent_y + 1),
+            ]:
+                if 0 <= pos[0] < self.grid_size and 0 <= pos[1] < self.grid_size:
+                    self.mark_surroundings(pos, "P", moore=False)
 
     def display(self):
-        print("-"*17)
+        print("-" * (2 * self.grid_size - 1))
         for row in self.grid:
             print(" ".join(map(str, row)))
-        print("-"*17)
+        print("-" * (2 * self.grid_size - 1))
@@ -0,0 +1,113 @@
+import argparse
+import os
+import struct
+import sys
+from array import array
+
+import bitboard
+from map_corpus import MapCorpus
+from map_env import Environment
+
+# file layout: header followed by one little endian int32 label per map
+# of the corpus, -1 for maps where the keymaker can not be reached; int16
+# overflows on grids with more than 32767 free cells
+MAGIC = b"ORC4"
+HEADER = struct.Struct("<4sI")
+# array typecode of a 4 byte signed int
+LABEL_TYPE = "i"
+# maps per worker task
+CHUNK_SIZE = 20000
+
+
+def optimal_moves(env):
+    """Fewest moves from the agent to the keymaker with full information.
+
+    Searches over (cell, has_key) states: the key is picked up at most once
+    and only changes the hazards, so the best route either avoids B or goes
+    start -> B under the initial hazards and B -> keymaker under the hazards
+    left by remove_agents and extend_sentinel_perception. Returns -1 if the
+    keymaker can not be reached. Agents count the final "e" answer as a
+    move as well, the optimal n_moves of an episode is this plus one.
+    """
+    n = env.grid_size
+    before, after = env.hazard_masks()
+    if env.key_position is None:
+        return bitboard.bfs_distance(
+            env.agent_position, env.keymaker_position, n, before
+        )
+    # stepping on B picks the key up, routes without the key go around it
+    key = bitboard.bit(*env.key_position, n)
+    best = bitboard.bfs_distance(
+        env.agent_position, env.keymaker_position, n, before | key
+    )
+    to_key = bitboard.bfs_distance(env.agent_position, env.key_position, n, before)
+    if to_key < 0 or 0 <= best <= to_key:
+        return best
+    from_key = bitboard.bfs_distance(
+        env.key_position, env.keymaker_position, n, after
+    )
+    if from_key < 0:
+        return best
+    if best < 0:
+        return to_key + from_key
+    return min(best, to_key + from_key)
+
+
+def _label_chunk(corpus_path, start, stop):
+    labels = array(LABEL_TYPE)
+    with MapCorpus(corpus_path) as corpus:
+        # takes the grid size from the corpus instead of generating a map
+        env = Environment(corpus=corpus)
+        for map_index in range(start, stop):
+            env.load_map(map_index)
+            labels.append(optimal_moves(env))
+    return labels
+
+
+def label_corpus(corpus_path, path, n_workers=None, chunk_size=CHUNK_SIZE):
+    """Writes the optimal move count of every map of a corpus to ``path``."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    with MapCorpus(corpus_path) as corpus:
+        n_maps = len(corpus)
+    with open(path, "wb") as f, ProcessPoolExecutor(
+        max_workers=n_workers or os.cpu_count()
+    ) as executor:
+        f.write(HEADER.pack(MAGIC, n_maps))
+        futures = [
+            executor.submit(
+                _label_chunk, corpus_path, start, min(start + chunk_size, n_maps)
+            )
+            for start in range(0, n_maps, chunk_size)
+        ]
+        # chunks are written in map order
+        for future in futures:
+            labels = future.result()
+            if sys.byteorder == "big":
+                labels.byteswap()
+            labels.tofile(f)
+
+
+def load_labels(path):
+    with open(path, "rb") as f:
+        magic, n_maps = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an oracle label file")
+        labels = array(LABEL_TYPE)
+        labels.fromfile(f, n_maps)
+    if sys.byteorder == "big":
+        labels.byteswap()
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    label_corpus(args.corpus, args.path, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import sys
+
+# tokens of the judge protocol, looked up instead of decoded one by one
+OBJECTS = {obj.encode(): obj for obj in ["P", "A", "S", "B", "K", "N"]}
+INTS = {str(i).encode(): i for i in range(100)}
+
+
+class ProtocolReader:
+    """Token reader over the judge's stdin.
+
+    Each read takes everything the judge has written so far (a whole
+    observation block in one call) and splits it once; complete lines are
+    turned into tokens, a partial last line waits for the next read.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = sys.stdin.buffer if stream is None else stream
+        self.tail = b""
+        self.tokens = []
+        self.pos = 0
+
+    def fill(self):
+        chunk = self.stream.read1(65536)
+        if not chunk:
+            raise EOFError
+        data = self.tail + chunk
+        end = data.rfind(b"\n") + 1
+        self.tail = data[end:]
+        self.tokens = self.tokens[self.pos :] + data[:end].split()
+        self.pos = 0
+
+    def token(self):
+        while self.pos >= len(self.tokens):
+            self.fill()
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def int(self):
+        token = self.token()
+        value = INTS.get(token)
+        return int(token) if value is None else value
+
+    def read_obs(self):
+        # the judge sends "y x obj", lines are returned as Environment
+        # observations [x, y, obj]
+        obs = []
+        for _ in range(self.int()):
+            y = self.int()
+            x = self.int()
+            token = self.token()
+            obs.append([x, y, OBJECTS.get(token) or token.decode()])
+        return obs
+
+
+class ProtocolWriter:
+    """Collects output lines and writes them with one call per turn."""
+
+    def __init__(self, stream=None):
+        self.stream = sys.stdout.buffer if stream is None else stream
+        self.buffer = bytearray()
+
+    def write(self, line):
+        self.buffer += line.encode()
+        self.buffer += b"\n"
+
+    def flush(self):
+        self.stream.write(self.buffer)
+        self.stream.flush()
+        self.buffer.clear()
+
+
+def format_obs(obs):
+    # Environment.get_obs lines are [x, y, obj], the judge sends "y x obj"
+    lines = [str(len(obs))]
+    lines.extend(f"{y} {x} {obj}" for x, y, obj in obs)
+    return "\n".join(lines) + "\n"
+
+
+class JudgeState:
+    """Game parameters sent by the judge, in place of an Environment."""
+
+    def __init__(self, keymaker_position, agent_perception_range, grid_size=9):
+        self.keymaker_position = keymaker_position
+        self.agent_perception_range = agent_perception_range
+        self.grid_size = grid_size
+
+
+def play(agent, reader=None, writer=None):
+    """Plays one judged game with an agent built on agent_core.GridAgent."""
+    reader = ProtocolReader() if reader is None else reader
+    writer = ProtocolWriter() if writer is None else writer
+
+    agent_perception_range = reader.int()
+    keymaker_y = reader.int()
+    keymaker_x = reader.int()
+    agent.initialize(JudgeState((keymaker_x, keymaker_y), agent_perception_range))
+    writer.write("m 0 0")
+    writer.flush()
+
+    while True:
+        move = agent.step(reader.read_obs())
+        if type(move) is str:
+            # the judge expects the length of the shortest known path
+            if move != "e -1":
+                move = f"e {agent.get_shortest_distance()}"
+            writer.write(move)
+            writer.flush()
+            return move
+        writer.write(f"m {move[1]} {move[0]}")
+        writer.flush()
+
+
+def serve(agent, reader=None, writer=None):
+    """Plays judged games one after another until the input ends.
+
+    Lets a judge keep one agent process and its pipes for many games.
+    """
+    reader = ProtocolReader() if reader is None else reader
+    writer = ProtocolWriter() if writer is None else writer
+    while True:
+        try:
+            play(agent, reader, writer)
+        except EOFError:
+            return
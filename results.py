@@ -0,0 +1,233 @@
+import csv
+import math
+
+
+class RunningStats:
+    """Single pass mean and population variance (Welford)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        # Chan et al. update for combining two partial aggregates
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def var(self):
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        return self.var**0.5
+
+
+class QuantileSketch:
+    """Log-bucketed histogram of non-negative values.
+
+    Quantiles are within ``relative_accuracy`` of the exact value and the
+    number of buckets grows with the logarithm of the value range only.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma**index / (self.gamma + 1)
+        return 0.0
+
+
+class ExperimentAggregator:
+    """Running statistics of one experiment, mergeable across workers."""
+
+    QUANTILES = [0.5, 0.9, 0.99]
+
+    def __init__(self, quantiles=False):
+        self.exec_time = RunningStats()
+        self.moves = RunningStats()
+        # outcomes are exact counts, fractions are taken in summary()
+        self.wins = 0
+        self.counters = {}
+        # solvability of the played maps, only known when the harness checks
+        self.checked = 0
+        self.solvable = 0
+        self.solvable_wins = 0
+        self.skipped = 0
+        self.regenerated = 0
+        self.sketches = None
+        if quantiles:
+            self.sketches = {"exec_time": QuantileSketch(), "moves": QuantileSketch()}
+
+    def add(self, exec_time, win, n_moves, counters=None, solvable=None):
+        self.exec_time.add(exec_time)
+        self.moves.add(n_moves)
+        self.wins += win
+        if solvable is not None:
+            self.checked += 1
+            if solvable:
+                self.solvable += 1
+                self.solvable_wins += win
+        if counters:
+            for name, value in counters.items():
+                self.counters.setdefault(name, RunningStats()).add(value)
+        if self.sketches is not None:
+            self.sketches["exec_time"].add(exec_time)
+            self.sketches["moves"].add(n_moves)
+
+    # unsolvable maps the harness did not play still count as checked maps
+    def add_skipped(self):
+        self.skipped += 1
+        self.checked += 1
+
+    def add_regenerated(self):
+        self.regenerated += 1
+        self.checked += 1
+
+    def merge(self, other):
+        self.exec_time.merge(other.exec_time)
+        self.moves.merge(other.moves)
+        self.wins += other.wins
+        self.checked += other.checked
+        self.solvable += other.solvable
+        self.solvable_wins += other.solvable_wins
+        self.skipped += other.skipped
+        self.regenerated += other.regenerated
+        for name, stats in other.counters.items():
+            self.counters.setdefault(name, RunningStats()).merge(stats)
+        if self.sketches is not None and other.sketches is not None:
+            for name, sketch in other.sketches.items():
+                self.sketches[name].merge(sketch)
+
+    def summary(self, exp_id):
+        results = {
+            "exp_id": exp_id,
+            "mean_exec_time": self.exec_time.mean,
+            "std_exec_time": self.exec_time.std,
+            "var_exec_time": self.exec_time.var,
+            "mean_moves": self.moves.mean,
+            "std_moves": self.moves.std,
+            "var_moves": self.moves.var,
+            "win_fraction": self.wins / self.moves.count,
+        }
+        if self.checked:
+            results["solvable_fraction"] = self.solvable / self.checked
+            results["win_fraction_solvable"] = (
+                self.solvable_wins / self.solvable if self.solvable else 0.0
+            )
+            results["skipped"] = self.skipped
+            results["regenerated"] = self.regenerated
+        # per episode search counters, only present for instrumented runs
+        for name, stats in self.counters.items():
+            results[f"mean_{name}"] = stats.mean
+        if self.sketches is not None:
+            for name, sketch in self.sketches.items():
+                for q in self.QUANTILES:
+                    results[f"p{round(q * 100)}_{name}"] = sketch.quantile(q)
+        return results
+
+
+class EpisodeWriter:
+    """Appends per-episode records to a CSV or Parquet file as they come.
+
+    Parquet output needs pyarrow and is written in row groups of
+    ``batch_size`` records, so memory stays bounded either way.
+    """
+
+    def __init__(self, path, batch_size=65536):
+        self.path = path
+        self.batch_size = batch_size
+        self.parquet = path.endswith(".parquet")
+        self.batch = []
+        self._file = None
+        self._writer = None
+
+    def write(self, record):
+        if self.parquet:
+            self.batch.append(record)
+            if len(self.batch) >= self.batch_size:
+                self._write_batch()
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="")
+            self._writer = csv.DictWriter(
+                self._file, fieldnames=list(record), lineterminator="\n"
+            )
+            self._writer.writeheader()
+        self._writer.writerow(record)
+
+    def _write_batch(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist(self.batch)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self.batch = []
+
+    def close(self):
+        if self.parquet:
+            if self.batch:
+                self._write_batch()
+            if self._writer is not None:
+                self._writer.close()
+        elif self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_results(path, rows, use_pandas=False):
+    # one line per metric and one column per experiment,
+    # the layout of the original pandas export
+    if use_pandas:
+        import pandas as pd
+
+        pd.DataFrame(rows).T.to_csv(path, index=True, header=False)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        for key in rows[0]:
+            writer.writerow([key] + [row.get(key, "") for row in rows])
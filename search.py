@@ -0,0 +1,306 @@
+import heapq
+from collections import deque
+from functools import lru_cache
+from time import perf_counter
+
+INF = float("inf")
+
+
+class SearchStats:
+    """Counters an agent collects while instrumentation is enabled."""
+
+    FIELDS = ["expanded", "pushed", "peak_frontier", "replans", "steps", "step_time"]
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.expanded = 0
+        self.pushed = 0
+        self.peak_frontier = 0
+        self.replans = 0
+        self.steps = 0
+        self.step_time = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class Deadline:
+    """Per move budget the searches check cooperatively.
+
+    ``seconds`` runs on the monotonic perf_counter clock from the last
+    start() and ``max_expansions`` counts the nodes expanded by all searches
+    since then, either can be None. A search that finds the budget spent
+    stops and returns its best partial result, ``hit`` tells the agent.
+    """
+
+    # expansions between two reads of the clock
+    CLOCK_INTERVAL = 16
+
+    def __init__(self, seconds=None, max_expansions=None):
+        self.seconds = seconds
+        self.max_expansions = max_expansions
+        self.start()
+
+    def start(self):
+        self.expires = None if self.seconds is None else perf_counter() + self.seconds
+        self.expansions = 0
+        self.hit = False
+
+    def expired(self):
+        # called once per expanded node
+        if self.hit:
+            return True
+        self.expansions += 1
+        if self.max_expansions is not None and self.expansions > self.max_expansions:
+            self.hit = True
+        elif (
+            self.expires is not None
+            and self.expansions % self.CLOCK_INTERVAL == 1
+            and perf_counter() >= self.expires
+        ):
+            self.hit = True
+        return self.hit
+
+
+def to_cell(position, grid_size):
+    return position[0] * grid_size + position[1]
+
+
+def to_position(cell, grid_size):
+    return divmod(cell, grid_size)
+
+
+@lru_cache(maxsize=None)
+def get_neighbors(grid_size):
+    # von Neumann neighbors of every flat cell index, computed once per size
+    neighbors = []
+    for x in range(grid_size):
+        for y in range(grid_size):
+            cell = x * grid_size + y
+            moves = []
+            for dx, dy in ((-1, 0), (0, -1), (0, 1), (1, 0)):
+                if 0 <= x + dx < grid_size and 0 <= y + dy < grid_size:
+                    moves.append(cell + dx * grid_size + dy)
+            neighbors.append(tuple(moves))
+    return tuple(neighbors)
+
+
+@lru_cache(maxsize=None)
+def get_buffers(n_states):
+    # best g-score, parent and closed flag of every state, shared by the
+    # searches over this many states; a search resets the states it touched
+    # before it returns, so the next one starts from clean buffers
+    return [INF] * n_states, [-1] * n_states, bytearray(n_states)
+
+
+def reconstruct_path(parent, start, target):
+    path = []
+    cell = target
+    while cell != start:
+        path.append(cell)
+        cell = parent[cell]
+    path.reverse()
+    return path
+
+
+def lowest_f(queue, closed):
+    # lowest f of the open cells of an A* queue of (f, g, cell) entries
+    while queue and closed[queue[0][2]]:
+        heapq.heappop(queue)
+    return queue[0][0] if queue else INF
+
+
+def raise_estimates(estimate, f, cells, best_g, closed):
+    # learning step of RTAA* after a cut search: no path from an expanded
+    # cell to the target is shorter than ``f``, the lowest f of the open
+    # cells, minus the g of that cell
+    if f == INF:
+        return
+    for cell in cells:
+        if closed[cell] and estimate.get(cell, 0) < f - best_g[cell]:
+            estimate[cell] = f - best_g[cell]
+
+
+def a_star(
+    start,
+    target,
+    grid_size,
+    blocked,
+    stats=None,
+    deadline=None,
+    penalty=None,
+    estimate=None,
+):
+    """Shortest path between flat cells avoiding the cells set in ``blocked``.
+
+    Returns the cells of the path without ``start``, or None if the target
+    can not be reached. Uses Manhattan distance as heuristic, keeps the
+    best known g-score and a parent pointer per cell in buffers reused
+    between calls. ``penalty`` is an optional non-negative extra cost of
+    entering each cell, the heuristic stays admissible. ``estimate`` maps
+    flat cells to learned distances to the target that replace Manhattan
+    distance, they have to be admissible as well.
+
+    When ``deadline`` expires the path to the reached cell with the lowest
+    heuristic is returned, that cell is tracked while cells are reached.
+    Without ``penalty`` a cut search also raises ``estimate`` for the cells
+    it expanded.
+    """
+    neighbors = get_neighbors(grid_size)
+    target_x, target_y = divmod(target, grid_size)
+    best_g, parent, closed = get_buffers(grid_size * grid_size)
+
+    x, y = divmod(start, grid_size)
+    h = abs(x - target_x) + abs(y - target_y)
+    if estimate is not None:
+        h = estimate.get(start, h)
+    best_g[start] = 0
+    # cells with a g-score, reset on the way out
+    touched = [start]
+    # reached cell closest to the target, the end of a cut search
+    best_cell = start
+    best_h = h
+    queue = [(h, 0, start)]
+    expanded = 0
+    pushed = 1
+    peak_frontier = 1
+    path = None
+
+    try:
+        while queue:
+            if stats is not None and len(queue) > peak_frontier:
+                peak_frontier = len(queue)
+            _, cur_len, cell = heapq.heappop(queue)
+            if closed[cell]:
+                continue
+            closed[cell] = 1
+            expanded += 1
+            if cell == target:
+                path = reconstruct_path(parent, start, target)
+                break
+
+            new_len = cur_len + 1
+            for move in neighbors[cell]:
+                if penalty is not None:
+                    new_len = cur_len + 1 + penalty[move]
+                if closed[move] or blocked[move] or new_len >= best_g[move]:
+                    continue
+                if best_g[move] == INF:
+                    touched.append(move)
+                best_g[move] = new_len
+                parent[move] = cell
+                x, y = divmod(move, grid_size)
+                h = abs(x - target_x) + abs(y - target_y)
+                if estimate is not None:
+                    h = estimate.get(move, h)
+                if h < best_h:
+                    best_cell, best_h = move, h
+                heapq.heappush(queue, (new_len + h, new_len, move))
+                pushed += 1
+            if deadline is not None and deadline.expired():
+                path = reconstruct_path(parent, start, best_cell)
+                if estimate is not None and penalty is None:
+                    f = lowest_f(queue, closed)
+                    raise_estimates(estimate, f, touched, best_g, closed)
+                break
+    finally:
+        for cell in touched:
+            best_g[cell] = INF
+            parent[cell] = -1
+            closed[cell] = 0
+
+    if stats is not None:
+        stats.expanded += expanded
+        stats.pushed += pushed
+        stats.peak_frontier = max(stats.peak_frontier, peak_frontier)
+    return path
+
+
+def bfs(start, targets, grid_size, blocked, stats=None, deadline=None, estimate=None):
+    """Shortest path from start to the nearest of the flat cells in targets,
+    avoiding the cells set in ``blocked``.
+
+    Cells are marked when they are enqueued and remember their parent, so
+    every cell enters the queue at most once. Returns the path without
+    ``start``, or None if no target can be reached. When ``deadline``
+    expires the path to the reached cell closest to a target is returned;
+    with a single target ``estimate`` may give learned distances to it
+    that replace Manhattan distance in that choice, and it is raised for
+    the expanded cells as after a cut A* search.
+    """
+    if start in targets:
+        return []
+    neighbors = get_neighbors(grid_size)
+    depth, parent, closed = get_buffers(grid_size * grid_size)
+    parent[start] = start
+    depth[start] = 0
+    # cells with a parent, reset on the way out
+    touched = [start]
+    queue = deque([start])
+    expanded = 0
+    pushed = 1
+    peak_frontier = 1
+    path = None
+
+    remaining = None
+    if deadline is not None:
+        # only a search that can be cut needs its closest reached cell
+        target_positions = [divmod(target, grid_size) for target in targets]
+        if len(targets) > 1:
+            estimate = None
+
+        def remaining(cell):
+            if estimate is not None and cell in estimate:
+                return estimate[cell]
+            x, y = divmod(cell, grid_size)
+            return min(abs(x - tx) + abs(y - ty) for tx, ty in target_positions)
+
+        best_cell = start
+        best_h = remaining(start)
+    else:
+        estimate = None
+
+    try:
+        while queue:
+            if stats is not None and len(queue) > peak_frontier:
+                peak_frontier = len(queue)
+            cell = queue.popleft()
+            expanded += 1
+            if estimate is not None:
+                closed[cell] = 1
+            for move in neighbors[cell]:
+                if parent[move] != -1 or blocked[move]:
+                    continue
+                parent[move] = cell
+                touched.append(move)
+                if estimate is not None:
+                    depth[move] = depth[cell] + 1
+                if move in targets:
+                    path = reconstruct_path(parent, start, move)
+                    queue.clear()
+                    break
+                queue.append(move)
+                pushed += 1
+                if remaining is not None:
+                    h = remaining(move)
+                    if h < best_h:
+                        best_cell, best_h = move, h
+            if path is None and deadline is not None and deadline.expired():
+                path = reconstruct_path(parent, start, best_cell)
+                if estimate is not None and queue:
+                    f = min(depth[cell] + remaining(cell) for cell in queue)
+                    raise_estimates(estimate, f, touched, depth, closed)
+                break
+    finally:
+        for cell in touched:
+            depth[cell] = INF
+            parent[cell] = -1
+            closed[cell] = 0
+
+    if stats is not None:
+        stats.expanded += expanded
+        stats.pushed += pushed
+        stats.peak_frontier = max(stats.peak_frontier, peak_frontier)
+    return path
@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import sys
+import time
+
+from fake_judge import percentile
+from map_env import Environment
+from oracle import optimal_moves
+from protocol import format_obs
+
+# the first reply of a new process includes interpreter startup
+STARTUP_TIMEOUT = 10.0
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class AgentProcess:
+    """One submission process started with --serve, reused between games."""
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.proc = None
+        self.fresh = True
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            "--serve",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        self.fresh = True
+
+    async def request(self, text, timeout):
+        """Sends a judge message and waits for the agent's reply line."""
+        self.proc.stdin.write(text.encode())
+        await self.proc.stdin.drain()
+        if self.fresh:
+            timeout = max(timeout, STARTUP_TIMEOUT)
+            self.fresh = False
+        line = await asyncio.wait_for(self.proc.stdout.readline(), timeout)
+        if not line:
+            raise ProtocolError("agent closed its output")
+        return line.split()
+
+    async def close(self):
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+        self.proc = None
+
+
+async def play_game(agent, env, agent_perception_range, move_timeout):
+    """Plays one game of env against a serving submission process.
+
+    Returns the answer of the agent (None if it broke the protocol, walked
+    into a danger or missed a deadline), whether it ended on the keymaker
+    and the turn latencies in nanoseconds. A process that did not finish the game
+    cleanly is closed, its state is unknown.
+    """
+    keymaker_x, keymaker_y = env.keymaker_position
+    request = f"{agent_perception_range}\n{keymaker_y} {keymaker_x}\n"
+    latencies = []
+    answer = None
+    try:
+        while True:
+            start_t = time.perf_counter_ns()
+            line = await agent.request(request, move_timeout)
+            latencies.append(time.perf_counter_ns() - start_t)
+            if line[0] == b"e":
+                answer = int(line[1])
+                break
+            if line[0] != b"m":
+                raise ProtocolError(f"unexpected reply {line!r}")
+            position = (int(line[2]), int(line[1]))
+            if position == env.agent_position:
+                obs = env.get_obs(position)
+            else:
+                obs = env.step(position)
+            request = format_obs(obs)
+    except (asyncio.TimeoutError, ProtocolError, ValueError, IndexError, OSError):
+        answer = None
+        await agent.close()
+    return answer, env.agent_position == env.keymaker_position, latencies
+
+
+class TournamentResults:
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.resigned = 0
+        # answers the judge would reject, a distance other than the oracle's
+        # or one given away from the keymaker
+        self.wrong_answers = 0
+        self.failures = 0
+        self.latencies = []
+
+    def add(self, answer, reached, latencies, best):
+        self.games += 1
+        if answer is None:
+            self.failures += 1
+        elif answer == -1:
+            self.resigned += 1
+        elif reached and answer == best:
+            self.wins += 1
+        else:
+            self.wrong_answers += 1
+        # the first reply of a game waits for the agent to read the map
+        self.latencies.extend(latencies[1:])
+
+
+async def run_tournament(
+    cmd, n_games, concurrency=64, seed=0, agent_perception_range=1, move_timeout=1.0
+):
+    """Plays n_games against ``concurrency`` pooled submission processes.
+
+    Game i is played on the map of Environment seeded with "seed:i", so
+    results do not depend on the scheduling of the games.
+    """
+    results = TournamentResults()
+    games = iter(range(n_games))
+
+    async def worker():
+        agent = AgentProcess(cmd)
+        try:
+            for game in games:
+                if agent.proc is None:
+                    await agent.start()
+                env = Environment(agent_perception_range, seed=f"{seed}:{game}")
+                # the game changes the map, the oracle sees it before
+                best = optimal_moves(env)
+                answer, reached, latencies = await play_game(
+                    agent, env, agent_perception_range, move_timeout
+                )
+                results.add(answer, reached, latencies, best)
+        finally:
+            await agent.close()
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, n_games))))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--perception", type=int, default=1)
+    parser.add_argument("--move-timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    start_t = time.perf_counter()
+    results = asyncio.run(
+        run_tournament(
+            [sys.executable, args.script],
+            args.games,
+            args.concurrency,
+            args.seed,
+            args.perception,
+            args.move_timeout,
+        )
+    )
+    elapsed = time.perf_counter() - start_t
+
+    print(
+        f"games: {results.games}, wins: {results.wins}, "
+        f"resigned: {results.resigned}, wrong answers: {results.wrong_answers}, "
+        f"failures: {results.failures}"
+    )
+    print(f"throughput: {results.games / elapsed:.1f} games/s")
+    if results.latencies:
+        for q in [0.5, 0.9, 0.99]:
+            print(
+                f"p{int(q * 100)} turn latency: "
+                f"{percentile(results.latencies, q) / 1e3:.1f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()